@@ -1,39 +1,43 @@
-import copy
-import json
+import multiprocessing
 import signal
 import sys
 import os
 import time
-import random
 
-from ryu.base import app_manager
 from ryu import cfg
 from ryu.controller import ofp_event
 from ryu.controller.controller import Datapath
 from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, DEAD_DISPATCHER
 from ryu.controller.handler import set_ev_cls
-from ryu.lib.packet import icmpv6
-from ryu.ofproto.ofproto_v1_3_parser import OFPFlowStatsRequest
-from ryu.ofproto.ofproto_v1_3 import OFPMPF_REQ_MORE
-from ryu.ofproto import inet
 import ryu.ofproto.ofproto_v1_3_parser as parser
 import ryu.ofproto.ofproto_v1_3 as ofproto
 from ryu.lib import hub
 from ryu.lib.packet import packet
 from ryu.lib.packet import ether_types
-from ryu.lib.packet import ethernet, arp, ipv4, ipv6,tcp
+from ryu.lib.packet import ethernet
 from timeit import default_timer as timer
-from netaddr import IPAddress, IPNetwork
 from ryu.cmd import manager
-from pprint import pprint
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
 import networkx as nx
-import pickle
 
 import utils.SetCover
-from utils.HostIdIPConverter import id_to_ip
-from .ControllerTemplate import ControllerTemplate
-from utils.FlowGenerator import generate_random_flows,generate_switch_flow_list
+from utils.CookieAllocator import CookieAllocator
+from utils.StatsStore import StatsStore, export_json
+from .ControllerTemplate import ControllerTemplate, PacketInStats
+from .RulePlan import COUNTING_PRIORITY, FORWARDING_PRIORITY, Rule, RulePlan
+from .FlowTableDiff import diff_flow_table
+from .NdpResponder import NdpResponder
+from .StatsCollector import StatsCollector, StatsRound
+from .PollingScheduler import PollingScheduler, StabilityWindow
+from .Planner import PLANNING_OPTIONS, load_flows, plan_flows, plan_polling
+from utils.FlowIndex import FlowIndex
+from utils.TopologyBundle import TopologyBundle
+from utils.Sharding import (all_shards_ready, flows_planned, mark_flows_planned, mark_shard_ready, merge_shard_stats,
+                            partition_polling, read_shard_plan, reset_shard_dir, shard_of, shard_port,
+                            write_shard_plan, write_shard_stats)
+
+# cookie of the rules that are not read by stats requests: NDP handling, forwarding and overrides
+FORWARDING_COOKIE = 1000000000
 
 
 class Controller(ControllerTemplate):
@@ -41,22 +45,41 @@ class Controller(ControllerTemplate):
     topology: nx.Graph
     switch_switch_port: dict[(int, int), int] # (switch id from, to) -> port id
     switch_host_port: dict[(int, int), int] # (switch id, host id) -> port id
+    flow_index: FlowIndex # compact flow <-> switch index backing flows and switch_flows
     flows: dict[int, [int]] # flow id -> list of switches on flow path
     switch_flows: dict[int, [int]] # switch id -> list of flow ids that pass though it
-    polling: dict[int, [int]] # switch id -> flows to poll statistics, [] if not polled
-    flow_stats: dict[int, int] # flow id -> number of packets
-    prev_flow_stats: dict[int, int]  # flow id -> number of packets
+    rule_plan: RulePlan # rules installed on each switch when it connects, None while flows are planned
+    polling: dict[int, [int]] # switch id -> flows to poll statistics, [] if not polled; None while planned
+    cookies: CookieAllocator # cookies of counting rules and the stats requests reading them
+    stats_collector: StatsCollector # correlates stats requests and replies of each polling round
+    stats_store: StatsStore # append-only log of the flows that changed in each round
+    flow_stats: dict[int, int] # flow id -> number of packets, owned by the stats collector
     switch_configured: dict[int, bool] # switch id -> bool
     online_switches: dict[int, Datapath] # switch id -> switch object
+    connected_switches: dict[int, Datapath] # switch id -> switch object, from its features reply until it disconnects
+    forwarding_ready: set[int] # switches that confirmed their forwarding rules
+    table_dumps: dict[(int, int), (Datapath, list)] # (switch id, xid) -> switch and flow entries received so far
+    setup_complete: bool # all switches were configured once and traffic was started
+    ndp_mode: str # controller: solicitations are answered by ndp_responder; static: hosts know their neighbors
+    ndp_responder: NdpResponder # prebuilt neighbor advertisements per target address
+    packet_in_stats: PacketInStats
     random_type: str
     pid_of_mininet: int
-    unchanged_count:int
+    num_shards: int # controller processes the switches are split over, 1 without sharding
+    shard_id: int # shard of this controller, 0 is the coordinator planning for all shards
+    shard_dir: str # files the shards coordinate through
 
     def __init__(self, *args, **kwargs):
         super(ControllerTemplate, self).__init__(*args, **kwargs)
         self.info('Controller started')
-        num_flows = cfg.CONF['flowcover']['num_flows']
+        self.init_batching(cfg.CONF['flowcover']['barrier_window'], cfg.CONF['flowcover']['max_inflight_barriers'])
         self.timeout = cfg.CONF['flowcover']['timeout']
+        self.num_shards = cfg.CONF['flowcover']['num_shards']
+        self.shard_id = cfg.CONF['flowcover']['shard_id']
+        self.shard_dir = cfg.CONF['flowcover']['shard_dir']
+        self.shards_ready_thread = None
+        if self.num_shards > 1:
+            self.init_shard()
         self.read_pid_of_mininet()
         print('Finished Reading PID of mininet')
         self.online_switches = {}
@@ -64,116 +87,183 @@ class Controller(ControllerTemplate):
         self.get_initial_topology()
         print('Topology obtained from mininet')
         print(f'Random Type: {self.random_type}')
-        self.flows = self.generate_random_flows(num_flows)
-        print(f'{num_flows} Random flows generated')
-        pprint(self.flows)
-        self.switch_flows = self.generate_switch_flow_list()
-        self.write_flows_to_file()
-        print('Flows written to file to notify mininet')
-        self.polling = self.set_cover()
-        print('SetCover calculation finished, solution:')
-        self.flow_stats = {}
-        self.prev_flow_stats = {}
-        self.monitor_thread = hub.spawn(self._monitor)
-        self.unchanged_count = 0
+        # filled in by _plan; until then connecting switches wait for their rules
+        self.flow_index = None
+        self.rule_plan = None
+        self.polling = None
+        self.stats_collector = None
+        self.connected_switches = {}
+        self.forwarding_ready = set()
+        self.table_dumps = {}
+        self.setup_complete = False
+        self.ndp_mode = cfg.CONF['flowcover']['ndp_mode']
+        self.ndp_responder = NdpResponder()
+        self.packet_in_stats = PacketInStats()
+        workers = cfg.CONF['flowcover']['planner_workers']
+        self.planner = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) if workers > 0 else None
+        self.planning_thread = hub.spawn(self._plan)
+
+    def init_shard(self) -> None:
+        """
+        Checks the shard setup; the coordinator clears the files of the previous run, so it has to start first.
+        """
+        if not 0 <= self.shard_id < self.num_shards:
+            raise ValueError(f'shard id {self.shard_id} out of range for {self.num_shards} shards')
+        listen_port = cfg.CONF.ofp_tcp_listen_port or shard_port(0)
+        if listen_port != shard_port(self.shard_id):
+            print(f'Warning: shard {self.shard_id} listens on port {listen_port}, '
+                  f'but mininet connects its switches to port {shard_port(self.shard_id)}')
+        if self.shard_id == 0:
+            reset_shard_dir(self.shard_dir)
+        print(f'Controller shard {self.shard_id} of {self.num_shards}')
+
+    def owns(self, switch_id: int) -> bool:
+        return self.num_shards == 1 or shard_of(switch_id, self.num_shards) == self.shard_id
 
     def read_pid_of_mininet(self) -> None:
         with open('pid.txt', 'r') as f:
             self.pid_of_mininet = int(f.readline())
 
     def get_initial_topology(self) -> None:
-        self.topology = nx.read_adjlist('topology.bin')
-        with open('random_type.txt', 'r') as f:
-            self.random_type = f.readline()
-            assert self.random_type in ['erdos-renyi', 'waxman', 'linear']
-        with open('switch_switch_port_id.bin', 'rb') as f:
-            self.switch_switch_port = pickle.load(f)
-        with open('switch_host_port_id.bin', 'rb') as f:
-            self.switch_host_port = pickle.load(f)
-        # set all switches to not configured
-        for s in self.topology.nodes:
-            self.switch_configured[int(s)] = False
-
+        # port tables are int-keyed mappings over the memory-mapped bundle, nothing is unpickled
+        self.topology_bundle = TopologyBundle('topology.bundle')
+        self.topology = self.topology_bundle.to_networkx()
+        self.random_type = self.topology_bundle.random_type
+        self.switch_switch_port = self.topology_bundle.switch_switch_port
+        self.switch_host_port = self.topology_bundle.switch_host_port
+        # set all switches to not configured; a shard only waits for its own
+        for s in self.topology_bundle.node_ids.tolist():
+            if self.owns(s):
+                self.switch_configured[s] = False
 
-    def generate_random_flows(self, m: int) -> dict[int, [int]]:
-        """
-        TODO: select random paths from topology and generate random flows
-        m is the number of random flows
-        Use self.topology and networkx.
-        return value should be a dict that maps flow ids (randomly taken, easiest way is to just increment)
-            to a list of switch ids that describe the path,
-        """
-
-        return generate_random_flows(m,self.topology)
 
     def generate_switch_flow_list(self) -> dict[int, [int]]:
         """
         TODO: Converts the dict of flows to the dict of switches where the flow passes through
         Output format: a dict that maps switch ids to a list of flow ids that run on the switch.
-        Use self.flows
+        The FlowIndex already holds this direction; its switch_flows view is shared without copying.
         :return:
         """
 
-        return generate_switch_flow_list(self.flows)
+        return self.flow_index.switch_flows
 
-    def write_flows_to_file(self) -> None:
-        with open('random_flows.bin', 'wb') as f:
-            pickle.dump(self.flows, f)
-
-    def set_cover(self) -> dict[int, [int]]:
+    def run_planner(self, fn, *args):
         """
-        TODO: transform the flow/switch_flow structure into set cover input and solve it
-        Use self.flows and self.switch_flows
-        :return: a dict: switch id -> flows to poll
-        you might want to create some more helper methods.
+        Runs a planning step in the planner process and yields to the hub until it is done,
+        so OpenFlow connections are served meanwhile. Runs in-process with --flowcover-planner-workers 0.
         """
-        # Step 1: construction
-        flows = list(self.flows.keys())
-        switch_flows = self.switch_flows
-        #switch_flows = deepcopy(self.switch_flows)
-        #for f in flows:
-        #    switch_flows[-f] = [f]
-        print(f'flows is{flows}')
-        print(f'switch_flows is{switch_flows}')
-
-        # Step 2: calculation
-        polling = utils.SetCover.set_cover_solve(flows,switch_flows)
-        # call utils.set_cover_solve here
-        return polling
+        if self.planner is None:
+            return fn(*args)
+        future = self.planner.submit(fn, *args)
+        while not future.done():
+            hub.sleep(0.05)
+        return future.result()
+
+    def _plan(self) -> None:
+        """
+        Plans flows, rules and polling off the hub. Forwarding rules go out as soon as the flows are known,
+        counting rules and polling once set cover is solved.
+        In sharded mode only the coordinator plans; the other shards read its flows and their part of the polling plan.
+        """
+        options = {name: cfg.CONF['flowcover'][name] for name in PLANNING_OPTIONS}
+        start = timer()
+        if self.shard_id == 0:
+            self.flow_index, self.rule_plan = self.run_planner(plan_flows, options)
+            if self.num_shards > 1:
+                mark_flows_planned(self.shard_dir)
+            print(f'{len(self.flow_index)} Random flows generated and written to file to notify mininet after {timer() - start:.2f}s')
+        else:
+            while not flows_planned(self.shard_dir):
+                hub.sleep(0.5)
+            self.flow_index, self.rule_plan = self.run_planner(load_flows)
+            print(f'{len(self.flow_index)} flows read from the coordinator after {timer() - start:.2f}s')
+        self.flows = self.flow_index.flows
+        self.switch_flows = self.generate_switch_flow_list()
+        for dp in list(self.connected_switches.values()):
+            self.resync(dp)
+
+        if self.shard_id == 0:
+            polling = self.run_planner(plan_polling, self.flow_index, options)
+            print(f'SetCover calculation finished after {timer() - start:.2f}s')
+            if self.num_shards > 1:
+                polling = self.partition_plan(polling)
+        else:
+            polling = read_shard_plan(self.shard_dir, self.shard_id)
+            while polling is None:
+                hub.sleep(0.5)
+                polling = read_shard_plan(self.shard_dir, self.shard_id)
+            print(f'Polling plan read from the coordinator after {timer() - start:.2f}s')
+        self.cookies = CookieAllocator(polling, aggregate=cfg.CONF['flowcover']['cookie_mask'])
+        # counting rules only go where set cover polls the flow
+        self.rule_plan.set_polling(polling)
+        print(f'Rule plan built: {self.rule_plan.report()}')
+        self.stats_collector = StatsCollector(self.cookies, window=cfg.CONF['flowcover']['stats_window'],
+                                              timeout=cfg.CONF['flowcover']['stats_timeout'],
+                                              max_retries=cfg.CONF['flowcover']['stats_retries'])
+        stats_dir = cfg.CONF['flowcover']['stats_dir']
+        if self.num_shards > 1:
+            stats_dir = os.path.join(stats_dir, f'shard_{self.shard_id}')
+        self.stats_store = StatsStore(stats_dir, cfg.CONF['flowcover']['stats_segment_mb'] * 2**20)
+        print(f'Stats log written to {self.stats_store.directory}')
+        self.flow_stats = self.stats_collector.flow_stats
+        self.polling = polling
+        # a second diff, now against the complete rule set, adds the counting rules and removes stale ones
+        for switch_id in list(self.forwarding_ready):
+            self.resync(self.connected_switches[switch_id])
+        if self.planner is not None:
+            self.planner.shutdown()
+        self.monitor_thread = hub.spawn(self._monitor)
 
-    def request_stats(self, datapath: Datapath) -> None:
+    def partition_plan(self, polling: dict[int, [int]]) -> dict[int, [int]]:
+        """
+        Hands every shard the polling plan of its switches.
+        :return: the part of the coordinator
+        """
+        if cfg.CONF['flowcover']['cookie_mask']:
+            # the cookie allocators of the shards deduplicate independently, so a flow could be polled by several
+            polling = utils.SetCover.deduplicate_polling(polling)
+        parts = partition_polling(polling, self.num_shards)
+        for shard_id, part in enumerate(parts):
+            if shard_id != 0:
+                write_shard_plan(self.shard_dir, shard_id, part)
+        print(f'Polling plan split over {self.num_shards} shards: '
+              f'{[sum(len(flows) for flows in part.values()) for part in parts]} polled flows')
+        return parts[0]
+
+    def request_stats(self, requests: dict[int, [(int, int)]] = None) -> StatsRound:
         """
         TODO: Request statistics according to the result of set cover algorithm.
         Use self.polling.
-        To poll all stats on a switch: use OFPFlowStatsRequest as before
         To poll one/some stats on a switch: use OFPFlowStatsRequest with cookies.
-        Refer to Ryu documentation for more details.
+        Polls one round on the online switches and waits until every request was answered or gave up.
+        The collector sends one exact request per flow, or one masked request per switch with --flowcover-cookie-mask,
+        and keeps at most --flowcover-stats-window of them in flight per switch.
+        :param requests: switch id -> list of (cookie, cookie mask) due, every request of every switch if None
+        :return: the finished round; its changes are already applied to self.flow_stats
         """
-        datapath_id = int(datapath.id)
-        for switch_id, flows in self.polling.items():
-            if datapath_id ==switch_id:
-                for flow_id in flows:
-                    cookie = flow_id  # Assuming flow_id can be directly used as a cookie
-                    cookie_mask = 0xFFFFFFFFFFFFFFFF  # Mask to match the exact cookie
-                    req = OFPFlowStatsRequest(datapath, 0, ofproto.OFPTT_ALL,
-                                                  ofproto.OFPP_ANY, ofproto.OFPG_ANY,
-                                                  cookie, cookie_mask)
-                    datapath.send_msg(req)
-
+        stats_round = self.stats_collector.start_round(self.online_switches, requests)
+        while not self.stats_collector.round_complete():
+            hub.sleep(0.05)
+            self.stats_collector.check_timeouts()
+        return stats_round
 
-
-    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
     def _flow_stats_reply_handler(self, ev) -> None:
-        #print("count is",self.unchanged_count)
         """
         TODO: Callback of received statistics. Record the data from individual flow.
-        Write results to self.flow_stats.
+        Multipart replies are matched to their request by xid and reassembled by the stats collector,
+        or by the flow table dump of a resyncing switch.
         """
-        body = ev.msg.body
-        #pprint(body)
-        for stat in body:
-            flow_id = stat.cookie
-            self.flow_stats[flow_id] = stat.byte_count
+        msg = ev.msg
+        dump = self.table_dumps.get((msg.datapath.id, msg.xid))
+        if dump is not None:
+            dump[1].extend(msg.body)
+            if not msg.flags & ofproto.OFPMPF_REPLY_MORE:
+                del self.table_dumps[(msg.datapath.id, msg.xid)]
+                self.table_dumped(*dump)
+            return
+        if self.stats_collector is not None:
+            self.stats_collector.handle_reply(msg)
 
 
 
@@ -192,30 +282,59 @@ class Controller(ControllerTemplate):
             if datapath.id in self.online_switches:
                 self.logger.debug('unregister switch: %x', datapath.id)
                 del self.online_switches[datapath.id]
-                self.switch_configured[datapath.id] = False
+                # a switch of another shard that connected here before it was moved must not block this shard
+                if self.owns(datapath.id):
+                    self.switch_configured[datapath.id] = False
+                self.forwarding_ready.discard(datapath.id)
+                # _plan resyncs every connected switch; a reconnect may already have replaced this datapath
+                if self.connected_switches.get(datapath.id) is datapath:
+                    del self.connected_switches[datapath.id]
+                for key in [key for key, (dp, _) in self.table_dumps.items() if dp is datapath]:
+                    del self.table_dumps[key]
+                if self.stats_collector is not None:
+                    self.stats_collector.forget(datapath.id)
 
     def _monitor(self):
-        while all(self.switch_configured.values()):
-            for dp in self.online_switches.values():
-                self.request_stats(dp)
-            # TODO: write self.flow_stats to a json under the stats/ directory, filename should include the current timestamp!
-            # Save flow_stats to a JSON file with a timestamped filename
-            timestamp = time.strftime("%Y%m%d-%H%M%S")
-            filename = f"stats/flow_stats.json"
-
-            # Ensure the stats directory exists
-            os.makedirs(os.path.dirname(filename), exist_ok=True)
-
-            with open(filename, 'w') as f:
-                json.dump(self.flow_stats, f, indent=4)
-            pprint(self.flow_stats)
-            if any(v > 0 for v in self.flow_stats.values()) and self.prev_flow_stats == self.flow_stats:
-                self.unchanged_count += 1
-            else:
-                self.unchanged_count = 0
-            print(f'Flows stats unchanged for {self.unchanged_count} times.')
-            if self.unchanged_count >= 10:
-                print("Flow stats stable (10 count). Waiting for server to quit.")
+        stable_rounds = cfg.CONF['flowcover']['stable_rounds']
+        stable_threshold = cfg.CONF['flowcover']['stable_threshold']
+        scheduler = PollingScheduler(self.cookies, self.polling.keys(),
+                                     interval=cfg.CONF['flowcover']['poll_interval'],
+                                     min_interval=cfg.CONF['flowcover']['poll_min_interval'],
+                                     max_interval=cfg.CONF['flowcover']['poll_max_interval'],
+                                     budget=cfg.CONF['flowcover']['poll_budget'],
+                                     adaptive=cfg.CONF['flowcover']['adaptive_polling'], now=timer())
+        # as many seconds as stable_rounds fixed sweeps used to take
+        stability = StabilityWindow(scheduler.interval.keys(), stable_rounds * cfg.CONF['flowcover']['poll_interval'],
+                                    stable_threshold, now=timer())
+        while True:
+            # switches may still be installing their counting rules, or resyncing after a reconnect
+            if not all(self.switch_configured.values()):
+                hub.sleep(1)
+                continue
+            requests = scheduler.due(timer(), self.online_switches.keys())
+            if not requests:
+                next_due = scheduler.next_due()
+                hub.sleep(max(0.05, next_due - timer()) if next_due is not None else 1)
+                continue
+            stats_round = self.request_stats(requests)
+            now = timer()
+            for request, request_changed in stats_round.answered:
+                scheduler.feedback((request.datapath_id, request.cookie, request.cookie_mask), request_changed, now)
+            for request in stats_round.given_up:
+                scheduler.retry((request.datapath_id, request.cookie, request.cookie_mask), now)
+            # replies only land in flow_stats once the round is complete, so every round is a consistent snapshot
+            changed = stats_round.changed
+            # only the changed flows are logged, with the time of the round; the writer thread does the I/O
+            self.stats_store.append(time.time(), changed)
+            print(f'{stats_round.report()}, {len(changed)} flows changed, stats version {self.stats_collector.version}; '
+                  f'{scheduler.report()}')
+            # decided on the dirty set of the round, no copy or scan of all stats
+            stability.record([(request.datapath_id, request.cookie, request.cookie_mask)
+                              for request, _ in stats_round.answered],
+                             len(changed), self.stats_collector.active_flows > 0, now)
+            print(f'Flows stats {stability.report(now)}.')
+            if stability.converged(now):
+                print(f"Flow stats stable ({stability.window:.0f}s). Waiting for server to quit.")
                 wait_time_start = timer()
                 server_quited: dict[int, bool] = {}
                 for flow_id in self.flows.keys():
@@ -233,116 +352,98 @@ class Controller(ControllerTemplate):
                         if os.path.exists(filename):
                             server_quited[flow_id] = True
                 print("All server exited. Exiting controller and mininet.")
-                os.kill(self.pid_of_mininet, signal.SIGUSR2)
-                os._exit(0)
-            self.prev_flow_stats = deepcopy(self.flow_stats)
-            hub.sleep(3)
+                self.stats_store.close()
+                self.export_stats()
+            next_due = scheduler.next_due()
+            hub.sleep(max(0.05, next_due - timer()) if next_due is not None else 1)
 
 
+    def export_stats(self) -> None:
+        """
+        Writes the final snapshot for figure8.sh and figures.ipynb, the full history is in the stats log, and exits.
+        In sharded mode the other shards hand their snapshot to the coordinator, which merges them and stops mininet.
+        """
+        if self.num_shards == 1:
+            export_json('stats/flow_stats.json', self.flow_stats)
+            os.kill(self.pid_of_mininet, signal.SIGUSR2)
+            os._exit(0)
+        write_shard_stats(self.shard_dir, self.shard_id, self.flow_stats)
+        if self.shard_id != 0:
+            print(f'Stats of shard {self.shard_id} handed to the coordinator.')
+            os._exit(0)
+        wait_time_start = timer()
+        flow_stats, missing = merge_shard_stats(self.shard_dir, range(self.num_shards))
+        while missing:
+            if timer() - wait_time_start >= self.timeout:
+                print(f'Shards {missing} did not hand over their stats in time. Their flows will be missing.')
+                break
+            time.sleep(1)
+            flow_stats, missing = merge_shard_stats(self.shard_dir, range(self.num_shards))
+        export_json('stats/flow_stats.json', flow_stats)
+        os.kill(self.pid_of_mininet, signal.SIGUSR2)
+        os._exit(0)
+
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def packet_in_handler(self, ev):
         """Packet-In Callback."""
+        start = timer()
         msg = ev.msg
         datapath = msg.datapath
         data = msg.data
         in_port = msg.match["in_port"]
-        pkt = packet.Packet(data)
-        eth = pkt.get_protocol(ethernet.ethernet)
-        # Handle ARP
-        if eth.ethertype == ether_types.ETH_TYPE_ARP:
+        # neighbor solicitations are answered from the raw bytes with a prebuilt advertisement, nothing is parsed
+        advertisement = self.ndp_responder.answer(data)
+        if advertisement is not None:
+            self.send_pkt(datapath, advertisement, port=in_port)
+        elif int.from_bytes(data[12:14], 'big') == ether_types.ETH_TYPE_ARP:
+            # Handle ARP
+            eth = packet.Packet(data).get_protocol(ethernet.ethernet)
             self.handle_arp(datapath, in_port, eth, data)
-            return
-        if eth.ethertype == ether_types.ETH_TYPE_IPV6:
-            pkt_ipv6 = pkt.get_protocol(ipv6.ipv6)
-            if pkt_ipv6.nxt == 58:
-                pkt_icmpv6 = pkt.get_protocol(icmpv6.icmpv6)
-                if pkt_icmpv6.type_ == 135:
-                    # create neighbor advertisement
-                    ndp_dst = pkt_icmpv6.data.dst
-                    response_pkt = packet.Packet()
-                    response_pkt.add_protocol(
-                        ethernet.ethernet(
-                            ethertype=ether_types.ETH_TYPE_IPV6,
-                            dst=eth.src,
-                            src='24:CD:AB:CD:AB:CD'
-                        )
-                    )
-                    response_ipv6 = copy.deepcopy(pkt_ipv6)
-                    response_ipv6.dst=pkt_ipv6.src
-                    response_ipv6.src=ndp_dst
-                    response_ipv6.nxt=58
-                    response_pkt.add_protocol(
-                        response_ipv6
-                    )
-                    response_pkt.add_protocol(
-                        icmpv6.icmpv6(
-                            type_=136,
-                            code=0,
-                            data=icmpv6.nd_neighbor(
-                                dst=ndp_dst,
-                                res=0x7,
-                                option=icmpv6.nd_option_tla(
-                                    hw_src='24:CD:AB:CD:AB:CD'
-                                )
-                            )
-                        )
-                    )
-                    self.send_pkt(datapath, response_pkt, port=in_port)
-
-    def program_single_flow(self, dp, current_switch_id: int, flow_id: int, priority: int, reverse: bool, count_stats: bool):
-        if not reverse:
-            switch_list = self.flows[flow_id]
+        self.packet_in_stats.record(start)
+
+    def rule_flow_mod(self, dp, rule: Rule):
+        actions = [parser.OFPActionOutput(rule.out_port)]
+        if rule.ipv6_flabel is not None:
+            match = parser.OFPMatch(
+                eth_type=ether_types.ETH_TYPE_IPV6,
+                #ip_proto=inet.IPPROTO_TCP,
+                ipv6_src=rule.ipv6_src,
+                ipv6_dst=rule.ipv6_dst,
+                ipv6_flabel=rule.ipv6_flabel,
+                #tcp_flags=(0x10, 0x13)
+            )
+            # overrides of flows that lost their forwarding rule share the forwarding cookie
+            cookie = self.cookies.cookie(rule.flow_id) if rule.count_stats else FORWARDING_COOKIE
+            return self.flow_mod(cookie=cookie, datapath=dp, match=match, actions=actions, priority=rule.priority)
         else:
-            switch_list = self.flows[flow_id][::-1]
-        first_switch_id = int(switch_list[0])
-        first_switch_ip = id_to_ip(first_switch_id)
-        last_switch_id = int(switch_list[-1])
-        last_switch_ip = id_to_ip(last_switch_id)
-
-        for counter, switch_id in enumerate(switch_list):
-            switch_id = int(switch_id)
-            if switch_id == current_switch_id:
-                if switch_id == last_switch_id:
-                    host_port = self.switch_host_port[(current_switch_id, last_switch_id)]
-                    actions = [parser.OFPActionOutput(host_port)]
-                else:
-                    next_switch_id = int(switch_list[counter + 1])
-                    out_port = self.switch_switch_port[(current_switch_id, next_switch_id)]
-                    actions = [parser.OFPActionOutput(out_port)]
-                if count_stats:
-                    match = parser.OFPMatch(
-                        eth_type=ether_types.ETH_TYPE_IPV6,
-                        #ip_proto=inet.IPPROTO_TCP,
-                        ipv6_src=f"{first_switch_ip}/64",
-                        ipv6_dst=f"{last_switch_ip}/64",
-                        ipv6_flabel=flow_id,
-                        #tcp_flags=(0x10, 0x13)
-                    )
-                    self.program_flow(cookie=flow_id, datapath=dp, match=match, actions=actions, priority=priority)
-                else:
-                    match = parser.OFPMatch(
-                        eth_type=ether_types.ETH_TYPE_IPV6,
-                        ipv6_src=f"{first_switch_ip}/64",
-                        ipv6_dst=f"{last_switch_ip}/64",
-                    )
-                    self.program_flow(cookie=1000000000, datapath=dp, match=match, actions=actions, priority=priority)
-
+            match = parser.OFPMatch(
+                eth_type=ether_types.ETH_TYPE_IPV6,
+                ipv6_src=rule.ipv6_src,
+                ipv6_dst=rule.ipv6_dst,
+            )
+            return self.flow_mod(cookie=FORWARDING_COOKIE, datapath=dp, match=match, actions=actions, priority=rule.priority)
+
+    def switch_flow_mods(self, dp, current_switch_id: int, forwarding: bool = True, counting: bool = True):
+        """
+        :param forwarding: include forwarding rules and, with --flowcover-ndp-mode controller, NDP handling
+        :param counting: include the counting rules of the flows polled on the switch
+        :return: generator of the FlowMods a switch gets when it connects
+        """
+        if not forwarding:
+            for rule in self.rule_plan.rules(current_switch_id, forwarding=False, counting=counting):
+                yield self.rule_flow_mod(dp, rule)
+            return
 
+        if self.ndp_mode == 'controller':
+            yield from self.ndp_flow_mods(dp, current_switch_id)
 
+        for rule in self.rule_plan.rules(current_switch_id, forwarding=True, counting=counting):
+            yield self.rule_flow_mod(dp, rule)
 
-    # This decorator makes sure that the function below is invoked
-    # every time a new switch is connected to our controller.
-    @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
-    def switch_features_handler(self, ev):
-        """SwitchConnect Callback."""
-        print(f"Switch {ev.msg.datapath.id} connected.")
-        dp = ev.msg.datapath
-        parser = dp.ofproto_parser
-        current_switch_id = ev.msg.datapath.id
-        print(current_switch_id)
-        #self.remove_flows(ev.msg.datapath, 0)
-
-
+    def ndp_flow_mods(self, dp, current_switch_id: int):
+        """
+        :return: generator of the rules sending solicitations to the controller and its advertisements to the host
+        """
         # Forward NDP to controller
         match = parser.OFPMatch(
             eth_type=ether_types.ETH_TYPE_IPV6,
@@ -350,7 +451,7 @@ class Controller(ControllerTemplate):
             icmpv6_type=135,
         )
         actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER)]
-        self.program_flow(cookie=1000000000, datapath=dp, match=match, actions=actions, priority=1)
+        yield self.flow_mod(cookie=FORWARDING_COOKIE, datapath=dp, match=match, actions=actions, priority=1)
 
         # Forward reinjected NDP packet to host
         match = parser.OFPMatch(
@@ -359,32 +460,160 @@ class Controller(ControllerTemplate):
             icmpv6_type=136,
         )
         actions = [parser.OFPActionOutput(self.switch_host_port[(current_switch_id, current_switch_id)])]
-        self.program_flow(cookie=1000000000, datapath=dp, match=match, actions=actions, priority=1)
+        yield self.flow_mod(cookie=FORWARDING_COOKIE, datapath=dp, match=match, actions=actions, priority=1)
+
+
+
+
+    # This decorator makes sure that the function below is invoked
+    # every time a new switch is connected to our controller.
+    @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
+    def switch_features_handler(self, ev):
+        """SwitchConnect Callback."""
+        print(f"Switch {ev.msg.datapath.id} connected.")
+        dp = ev.msg.datapath
+        current_switch_id = ev.msg.datapath.id
+        print(current_switch_id)
+        if not self.owns(current_switch_id):
+            print(f'Switch {current_switch_id} belongs to shard {shard_of(current_switch_id, self.num_shards)}, ignored.')
+            return
+        #self.remove_flows(ev.msg.datapath, 0)
+
+        self.connected_switches[current_switch_id] = dp
+        self.forwarding_ready.discard(current_switch_id)
+        # otherwise _plan installs the rules once the flows are generated
+        if self.rule_plan is not None:
+            self.resync(dp)
+
+    def resync(self, dp) -> None:
+        """
+        Dumps the flow table of a connecting switch; table_dumped installs only what differs from the plan.
+        A switch that merely lost its connection keeps its rules and counters, so it is back after one round trip.
+        """
+        req = parser.OFPFlowStatsRequest(dp, 0, ofproto.OFPTT_ALL, ofproto.OFPP_ANY, ofproto.OFPG_ANY, 0, 0)
+        dp.set_xid(req)
+        self.table_dumps[(dp.id, req.xid)] = (dp, [])
+        dp.send_msg(req)
+
+    def table_dumped(self, dp, entries: list) -> None:
+        """
+        Installs the missing and changed rules of a switch and removes our rules that are no longer planned.
+        Before set cover is solved only the forwarding rules are compared and nothing is removed;
+        once it is, the switch is dumped and diffed again against the complete rule set.
+        """
+        complete = self.polling is not None
+        diff = diff_flow_table(self.switch_flow_mods(dp, dp.id, counting=complete), entries,
+                               self.is_own_entry if complete else None)
+        print(f'Switch {dp.id} resync: {len(entries)} entries in its table, {diff.report()}')
+        removals = [self.flow_delete(dp, entry.match, entry.priority, entry.table_id) for entry in diff.extra]
+        # rules are only in the table once the barrier of the last batch is answered
+        self.install(dp, removals + diff.missing + diff.changed,
+                     on_complete=self.switch_resynced if complete else self.switch_forwarding_installed)
+
+    @staticmethod
+    def is_own_entry(entry) -> bool:
+        """
+        :return: whether a flow entry was installed by a controller run, ARP rules learned by handle_arp are not
+        """
+        return entry.cookie == FORWARDING_COOKIE or entry.priority in (FORWARDING_PRIORITY, COUNTING_PRIORITY)
+
+    def switch_resynced(self, dp) -> None:
+        self.forwarding_ready.add(dp.id)
+        self.switch_installed(dp)
 
-        for flow_id in self.flows:
-            self.program_single_flow(dp, current_switch_id, flow_id, 2, reverse=False, count_stats=False)
-            self.program_single_flow(dp, current_switch_id, flow_id, 2, reverse=True, count_stats=False)
-            self.program_single_flow(dp, current_switch_id, flow_id, 3, reverse=False, count_stats=True)
+    def switch_forwarding_installed(self, dp) -> None:
+        self.forwarding_ready.add(dp.id)
+        # otherwise _plan resyncs the switch once set cover is solved
+        if self.polling is not None:
+            self.resync(dp)
 
-        self.switch_configured[current_switch_id] = True
+    def switch_installed(self, dp) -> None:
+        """
+        Called when a switch confirmed all of its rules.
+        """
+        self.switch_configured[dp.id] = True
         # Count how many switches are set up
         num_switches_done = len({k: v for k, v in self.switch_configured.items() if v == True})
         print(f'A total of {num_switches_done} switches were configured.')
         if all(self.switch_configured.values()):
-            print('All switches setup complete; sending signal to notify mininet')
-            # if all switch configured: notify mininet to start generating traffic
-            os.kill(self.pid_of_mininet, signal.SIGUSR1)
+            if self.setup_complete:
+                print('All switches configured again, monitoring resumes')
+                return
+            self.setup_complete = True
+            throughput = self.install_throughput()
+            print(f'All switches setup complete, {sum(throughput.values()) / len(throughput):.0f} messages/s per switch '
+                  f'on average; sending signal to notify mininet')
+            if self.num_shards == 1:
+                # if all switch configured: notify mininet to start generating traffic
+                os.kill(self.pid_of_mininet, signal.SIGUSR1)
+                return
+            mark_shard_ready(self.shard_dir, self.shard_id)
+            if self.shard_id == 0 and self.shards_ready_thread is None:
+                self.shards_ready_thread = hub.spawn(self._wait_for_shards)
+
+    def _wait_for_shards(self) -> None:
+        """
+        Traffic starts once every shard configured its switches.
+        """
+        while not all_shards_ready(self.shard_dir, self.num_shards):
+            hub.sleep(0.5)
+        print(f'All {self.num_shards} shards setup complete')
+        os.kill(self.pid_of_mininet, signal.SIGUSR1)
 
 
 
 
 def main():
     # Register a new CLI parameter for Ryu; no docs available; see Stackoverflow #25601133
-    # CLI param: --flowcover-num-flows --flowcover-timeout
+    # CLI param: --flowcover-num-flows --flowcover-timeout --flowcover-set-cover-engine --flowcover-set-cover-budget
+    #            --flowcover-cookie-mask --flowcover-set-cover-workers --flowcover-set-cover-part-flows
+    #            --flowcover-cache-dir --flowcover-cache-max-mb --flowcover-switch-capacity --flowcover-switch-capacity-bytes
+    #            --flowcover-max-path-length --flowcover-seed --flowcover-barrier-window --flowcover-max-inflight-barriers
+    #            --flowcover-stats-window --flowcover-stats-timeout --flowcover-stats-retries
+    #            --flowcover-stats-dir --flowcover-stats-segment-mb --flowcover-stable-rounds --flowcover-stable-threshold
+    #            --flowcover-adaptive-polling --flowcover-poll-interval --flowcover-poll-min-interval
+    #            --flowcover-poll-max-interval --flowcover-poll-budget --flowcover-planner-workers
+    #            --flowcover-num-shards --flowcover-shard-id --flowcover-shard-dir --flowcover-ndp-mode
     cfg.CONF.register_cli_opts(
         [
             cfg.IntOpt('num-flows', default=10),
-            cfg.IntOpt('timeout', default=900)
+            cfg.IntOpt('timeout', default=900),
+            cfg.StrOpt('set-cover-engine', default='heapq', choices=list(utils.SetCover.SET_COVER_ENGINES.keys())),
+            cfg.FloatOpt('set-cover-budget', default=0, help='seconds spent improving the greedy set cover, 0 to disable'),
+            cfg.BoolOpt('cookie-mask', default=False, help='poll all flows of a switch with one cookie-masked request'),
+            cfg.IntOpt('set-cover-workers', default=0, help='processes solving independent set cover parts, 0 to solve in-process'),
+            cfg.IntOpt('set-cover-part-flows', default=50000, help='flows above which a component is cut into regions'),
+            cfg.StrOpt('cache-dir', default='.set_cover_cache', help='set cover solution cache, empty to disable; only hits '
+                       'when the flows (--flowcover-seed) and the topology (network --seed) are seeded'),
+            cfg.IntOpt('cache-max-mb', default=256),
+            cfg.IntOpt('switch-capacity', default=0, help='max flows polled per switch and round, 0 for unlimited'),
+            cfg.IntOpt('switch-capacity-bytes', default=0, help='max reply bytes per switch and round, 0 for unlimited'),
+            cfg.IntOpt('max-path-length', default=0, help='longest random flow path in switches, 0 for the number of switches'),
+            cfg.IntOpt('seed', default=None, help='seed of the random flow generation, random if not given, which also '
+                       'makes every run miss the set cover cache'),
+            cfg.IntOpt('barrier-window', default=1000, help='FlowMods sent in one write and confirmed by one barrier'),
+            cfg.IntOpt('max-inflight-barriers', default=4, help='unconfirmed FlowMod windows per switch'),
+            cfg.IntOpt('stats-window', default=64, help='flow stats requests in flight per switch'),
+            cfg.FloatOpt('stats-timeout', default=2.0, help='seconds until an unanswered stats request is resent'),
+            cfg.IntOpt('stats-retries', default=3, help='resends before a stats request is given up'),
+            cfg.StrOpt('stats-dir', default='stats/log', help='append-only log of the stats of every round, in a new '
+                       'run_NNNNN directory per run'),
+            cfg.IntOpt('stats-segment-mb', default=64, help='size after which the stats log starts a new segment'),
+            cfg.IntOpt('stable-rounds', default=10, help='poll intervals without changes, in which every request was '
+                       'answered, after which the stats count as converged'),
+            cfg.IntOpt('stable-threshold', default=0, help='changed flows a round may have and still count as unchanged'),
+            cfg.BoolOpt('adaptive-polling', default=True, help='adapt the interval of each request to its rate of change'),
+            cfg.FloatOpt('poll-interval', default=3.0, help='initial interval of every stats request, in seconds'),
+            cfg.FloatOpt('poll-min-interval', default=1.0, help='shortest interval of changing requests'),
+            cfg.FloatOpt('poll-max-interval', default=30.0, help='longest interval of unchanged requests'),
+            cfg.FloatOpt('poll-budget', default=0, help='max stats requests per second over all switches, 0 for unlimited'),
+            cfg.IntOpt('planner-workers', default=1, help='processes planning flows and set cover off the hub, 0 to plan in-process'),
+            cfg.IntOpt('num-shards', default=1, help='controller processes the switches are split over'),
+            cfg.IntOpt('shard-id', default=0, help='shard of this controller, 0 plans for all shards and has to start first'),
+            cfg.StrOpt('shard-dir', default='shards', help='directory the shards exchange plans and stats through'),
+            cfg.StrOpt('ndp-mode', default='controller', choices=['controller', 'static'],
+                       help='controller: answer neighbor solicitations from prebuilt advertisements; '
+                            'static: no solicitations reach the controller, run the network with --static-neighbors')
         ]
     , 'flowcover')
     sys.argv.append('controller.Controller')
@@ -1,16 +1,96 @@
+from itertools import islice
+from timeit import default_timer as timer
+from typing import Callable, Iterable, Iterator, Optional
+
 from ryu.base import app_manager
 import ryu.ofproto.ofproto_v1_3_parser as parser
 import ryu.ofproto.ofproto_v1_3 as ofproto
 from ryu.controller import ofp_event
-from ryu.controller.handler import set_ev_cls, CONFIG_DISPATCHER
+from ryu.controller.handler import set_ev_cls, CONFIG_DISPATCHER, MAIN_DISPATCHER
 from ryu.lib.packet import ether_types
 
 
+class InstallState:
+    """
+    Progress of a batched install on one datapath.
+    """
+
+    def __init__(self, datapath, msgs: Iterator, on_complete: Optional[Callable]):
+        self.datapath = datapath
+        self.msgs = msgs
+        self.on_complete = on_complete
+        self.exhausted = False
+        self.inflight: dict[int, int] = {}  # barrier xid -> number of messages it confirms
+        self.sent_msgs = 0
+        self.sent_bytes = 0
+        self.acked_msgs = 0
+        self.writes = 0
+        self.start = timer()
+        self.end: Optional[float] = None
+
+    def done(self) -> bool:
+        return self.exhausted and not self.inflight
+
+    def throughput(self) -> float:
+        """
+        :return: confirmed messages per second
+        """
+        elapsed = (self.end or timer()) - self.start
+        return self.acked_msgs / elapsed if elapsed > 0 else 0.0
+
+
+class PacketInStats:
+    """
+    Packet-ins handled and the time spent handling them, reported every report_interval seconds.
+    """
+
+    def __init__(self, report_interval: float = 5.0):
+        self.report_interval = report_interval
+        self.count = 0
+        self.busy = 0.0
+        self.max_latency = 0.0
+        self.last_report = timer()
+
+    def record(self, start: float) -> None:
+        """
+        Counts a packet-in whose handling started at start and prints a report when one is due.
+        """
+        now = timer()
+        latency = now - start
+        self.count += 1
+        self.busy += latency
+        self.max_latency = max(self.max_latency, latency)
+        if now - self.last_report >= self.report_interval:
+            print(self.report(now))
+            self.count, self.busy, self.max_latency, self.last_report = 0, 0.0, 0.0, now
+
+    def report(self, now: float) -> str:
+        elapsed = now - self.last_report
+        mean = self.busy / self.count if self.count else 0.0
+        return (f'Packet-in: {self.count / elapsed:.0f}/s over {elapsed:.1f}s, handled in {mean * 1e6:.0f}us mean '
+                f'{self.max_latency * 1e6:.0f}us max, {self.busy / elapsed:.1%} of the hub')
+
+
 class ControllerTemplate(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto.OFP_VERSION]
 
     def __init__(self, *args, **kwargs):
         super(ControllerTemplate, self).__init__(*args, **kwargs)
+        self.init_batching()
+
+    def init_batching(self, barrier_window: int = 1000, max_inflight_barriers: int = 4):
+        """
+        Sets up batched installs, see install.
+
+        Args:
+            barrier_window (int): messages serialized into one write and
+                confirmed by one barrier.
+            max_inflight_barriers (int): windows sent to a switch before
+                waiting for the oldest barrier reply.
+        """
+        self.barrier_window = barrier_window
+        self.max_inflight_barriers = max_inflight_barriers
+        self.installs: dict[int, InstallState] = {}  # datapath id -> batched install
 
     def info(self, text):
         print("*" * (len(text) + 4))
@@ -25,6 +105,17 @@ class ControllerTemplate(app_manager.RyuApp):
             hard_timeout=0, idle_timeout=0, table_id=0):
         """
         Programs a flow to the switch identified by the given datapath.
+        Sent right away; use flow_mod with install for bulk programming.
+        See flow_mod for the arguments.
+        """
+        datapath.send_msg(self.flow_mod(datapath, match, actions, cookie, priority=priority,
+                                        hard_timeout=hard_timeout, idle_timeout=idle_timeout, table_id=table_id))
+
+    def flow_mod(
+            self, datapath, match, actions, cookie, priority=0,
+            hard_timeout=0, idle_timeout=0, table_id=0):
+        """
+        Builds the message that programs a flow to the switch identified by the given datapath.
 
         Args:
             datapath: Describes an the connection between the controller
@@ -49,7 +140,7 @@ class ControllerTemplate(app_manager.RyuApp):
                 ofproto.OFPIT_APPLY_ACTIONS, actions
             )
         ]
-        flowmod = parser.OFPFlowMod(
+        return parser.OFPFlowMod(
             datapath,
             match=match,
             cookie=cookie,
@@ -59,7 +150,98 @@ class ControllerTemplate(app_manager.RyuApp):
             idle_timeout=idle_timeout,
             table_id=table_id
         )
-        datapath.send_msg(flowmod)
+
+    def flow_delete(self, datapath, match, priority=0, table_id=0):
+        """
+        Builds the message that removes exactly the flow with the given
+        match and priority, leaving overlapping flows in place.
+
+        Args:
+            datapath: The switch to remove the flow from.
+            match: Match of the flow, as reported by the switch.
+            priority (int): Priority level of the flow entry.
+            table_id (int): table id of the flow entry.
+        """
+        return parser.OFPFlowMod(
+            datapath,
+            table_id=table_id,
+            command=ofproto.OFPFC_DELETE_STRICT,
+            priority=priority,
+            out_port=ofproto.OFPP_ANY,
+            out_group=ofproto.OFPG_ANY,
+            match=match
+        )
+
+    def install(self, datapath, msgs: Iterable, on_complete: Optional[Callable] = None):
+        """
+        Sends messages to a switch in batches and calls on_complete(datapath)
+        once the switch confirmed all of them.
+
+        Every barrier_window messages are serialized into a single write
+        followed by an OFPBarrierRequest. At most max_inflight_barriers
+        windows are unconfirmed at any time; the next window is only
+        serialized when a barrier reply arrives, so the control channel
+        is never flooded and msgs may be a lazy generator.
+        A new install on the same datapath replaces the previous one.
+
+        Args:
+            datapath: The switch to program.
+            msgs: OpenFlow messages, e.g. built with flow_mod.
+            on_complete: Called with the datapath after the last barrier
+                reply, or right away when there are no messages.
+        """
+        state = InstallState(datapath, iter(msgs), on_complete)
+        self.installs[datapath.id] = state
+        self._pump_install(state)
+
+    def _pump_install(self, state: InstallState):
+        datapath = state.datapath
+        while not state.exhausted and len(state.inflight) < self.max_inflight_barriers:
+            buf = bytearray()
+            count = 0
+            for msg in islice(state.msgs, self.barrier_window):
+                datapath.set_xid(msg)
+                msg.serialize()
+                buf += msg.buf
+                count += 1
+            if count < self.barrier_window:
+                state.exhausted = True
+            if count == 0:
+                # the barrier of the previous window already confirms the last message
+                break
+            barrier = parser.OFPBarrierRequest(datapath)
+            datapath.set_xid(barrier)
+            barrier.serialize()
+            buf += barrier.buf
+            state.inflight[barrier.xid] = count
+            state.sent_msgs += count
+            state.sent_bytes += len(buf)
+            state.writes += 1
+            datapath.send(bytes(buf))
+        if state.done() and state.end is None:
+            state.end = timer()
+            print(f'Switch {datapath.id}: {state.acked_msgs} messages ({state.sent_bytes} bytes, '
+                  f'{state.writes} writes) installed in {state.end - state.start:.2f}s, '
+                  f'{state.throughput():.0f} messages/s')
+            if state.on_complete is not None:
+                state.on_complete(datapath)
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def barrier_reply_handler(self, ev):
+        """Confirms a window of a batched install and sends the next one."""
+        datapath = ev.msg.datapath
+        state = self.installs.get(datapath.id)
+        # replies of a replaced install or of barriers sent elsewhere are not ours
+        if state is None or state.datapath is not datapath or ev.msg.xid not in state.inflight:
+            return
+        state.acked_msgs += state.inflight.pop(ev.msg.xid)
+        self._pump_install(state)
+
+    def install_throughput(self) -> dict[int, float]:
+        """
+        :return: datapath id -> confirmed messages per second of its latest install
+        """
+        return {dpid: state.throughput() for dpid, state in self.installs.items()}
 
     def remove_flows(self, datapath, table_id):
         """Removing all flow entries."""
@@ -0,0 +1,83 @@
+from typing import Callable, Iterable, Optional
+
+from netaddr import IPAddress, IPNetwork
+
+# Switches report matches back normalized, not as they were sent: '2001:db8:1:a::1/64' comes back as the masked
+# network and mask, a full mask is dropped. Addresses are compared as canonical CIDR strings.
+IPV6_FIELDS = ('ipv6_src', 'ipv6_dst', 'ipv6_nd_target')
+
+
+def normalize_field(name: str, value):
+    """
+    :return: a comparable form of a match field value as sent in a FlowMod or reported in a flow stats reply
+    """
+    if name in IPV6_FIELDS:
+        if isinstance(value, tuple):
+            address, mask = value
+            prefix_length = IPAddress(mask).netmask_bits()
+        elif '/' in value:
+            address, prefix_length = value.split('/')
+        else:
+            address, prefix_length = value, 128
+        return str(IPNetwork(f'{address}/{prefix_length}').cidr)
+    if isinstance(value, tuple) and all(isinstance(v, int) for v in value):
+        return value[0] & value[1], value[1]
+    if isinstance(value, str):
+        return value.lower()
+    return value
+
+
+def entry_key(table_id: int, priority: int, match) -> tuple:
+    """
+    :return: what identifies a flow entry in OpenFlow: table, priority and match
+    """
+    return table_id, priority, frozenset((name, normalize_field(name, value)) for name, value in match.items())
+
+
+def entry_ports(instructions) -> tuple:
+    """
+    :return: the output ports of the actions of a flow entry, which are all that differs between our rules
+    """
+    return tuple(getattr(action, 'port', None) for instruction in instructions
+                 for action in getattr(instruction, 'actions', []))
+
+
+class TableDiff:
+    """
+    Difference between the flow table of a switch and the rules planned for it.
+    """
+
+    def __init__(self):
+        self.missing = []  # FlowMods of planned rules the switch does not have
+        self.changed = []  # FlowMods of planned rules the switch has with another cookie or other actions
+        self.extra = []  # flow stats of our entries the switch has but that are not planned
+        self.unchanged = 0
+
+    def report(self) -> str:
+        return (f'{self.unchanged} rules unchanged, {len(self.missing)} missing, {len(self.changed)} changed, '
+                f'{len(self.extra)} to remove')
+
+
+def diff_flow_table(planned: Iterable, installed: Iterable, owned: Optional[Callable] = None) -> TableDiff:
+    """
+    Compares entries by table, priority and match; an entry with the same key is up to date if its cookie and
+    output ports are the same, so its counters survive the resync.
+    :param planned: the OFPFlowMods a switch should have
+    :param installed: the OFPFlowStats of a full flow table dump
+    :param owned: tells whether an installed entry is one of our rules and may be removed if not planned;
+        None to keep everything not planned, e.g. while the planned rules are not complete yet
+    :return: the difference
+    """
+    table = {entry_key(entry.table_id, entry.priority, entry.match): entry for entry in installed}
+    diff = TableDiff()
+    for msg in planned:
+        entry = table.pop(entry_key(msg.table_id, msg.priority, msg.match), None)
+        if entry is None:
+            diff.missing.append(msg)
+        elif entry.cookie != msg.cookie or entry_ports(entry.instructions) != entry_ports(msg.instructions):
+            diff.changed.append(msg)
+        else:
+            diff.unchanged += 1
+    if owned is not None:
+        diff.extra = [entry for entry in table.values() if owned(entry)]
+    return diff
@@ -0,0 +1,93 @@
+import struct
+from typing import Optional
+
+from utils.HostIdIPConverter import id_to_mac
+
+# Offsets in an untagged Ethernet frame carrying IPv6 without extension headers, which is how hosts send NDP.
+ETH_SRC = slice(6, 12)
+ETH_TYPE = slice(12, 14)
+IPV6_NEXT_HEADER = 20
+IPV6_SRC = slice(22, 38)
+IPV6_DST = slice(38, 54)
+ICMPV6_TYPE = 54
+ICMPV6_CHECKSUM = slice(56, 58)
+ND_TARGET = slice(62, 78)
+NS_MIN_LENGTH = 78
+
+ETH_TYPE_IPV6 = b'\x86\xdd'
+IPPROTO_ICMPV6 = 58
+ICMPV6_NEIGHBOR_SOLICITATION = 135
+ICMPV6_NEIGHBOR_ADVERTISEMENT = 136
+NA_FLAGS = 0xE0000000  # router, solicited, override
+NA_PAYLOAD_LENGTH = 32  # NA with a target link-layer address option
+ND_OPTION_TLA = 2
+
+
+def _mac_to_bin(mac: str) -> bytes:
+    return bytes.fromhex(mac.replace(':', ''))
+
+
+def _sum_words(data: bytes) -> int:
+    return sum(struct.unpack(f'!{len(data) // 2}H', data))
+
+
+class NdpResponder:
+    """
+    Answers neighbor solicitations with prebuilt neighbor advertisements. All hosts share one MAC address,
+    so an advertisement only depends on its target; one template per target is serialized once and only the
+    destination MAC, the destination address and the checksum are patched in for every solicitation.
+    The checksum sum of everything but the destination address is kept with the template.
+    """
+
+    def __init__(self, mac: str = id_to_mac(0)):
+        """
+        :param mac: MAC address every target is advertised with
+        """
+        self.mac = _mac_to_bin(mac)
+        self.templates: dict[bytes, tuple[bytearray, int]] = {}  # target address -> NA frame and partial checksum
+
+    @staticmethod
+    def parse_solicitation(data: bytes) -> Optional[tuple[bytes, bytes, bytes]]:
+        """
+        :return: (source MAC, source address, target address) of a neighbor solicitation,
+            None for every other packet
+        """
+        if (len(data) < NS_MIN_LENGTH or data[ETH_TYPE] != ETH_TYPE_IPV6 or data[IPV6_NEXT_HEADER] != IPPROTO_ICMPV6
+                or data[ICMPV6_TYPE] != ICMPV6_NEIGHBOR_SOLICITATION):
+            return None
+        return bytes(data[ETH_SRC]), bytes(data[IPV6_SRC]), bytes(data[ND_TARGET])
+
+    def template(self, target: bytes) -> tuple[bytearray, int]:
+        if target not in self.templates:
+            icmp = (struct.pack('!BBHI', ICMPV6_NEIGHBOR_ADVERTISEMENT, 0, 0, NA_FLAGS) + target
+                    + struct.pack('!BB', ND_OPTION_TLA, 1) + self.mac)
+            frame = bytearray(bytes(6) + self.mac + ETH_TYPE_IPV6
+                              + struct.pack('!IHBB', 0x60000000, NA_PAYLOAD_LENGTH, IPPROTO_ICMPV6, 255)
+                              + target + bytes(16) + icmp)
+            # pseudo header without the destination address, then the message with a zero checksum
+            partial = _sum_words(target) + NA_PAYLOAD_LENGTH + IPPROTO_ICMPV6 + _sum_words(icmp)
+            self.templates[target] = (frame, partial)
+        return self.templates[target]
+
+    def advertisement(self, eth_dst: bytes, ipv6_dst: bytes, target: bytes) -> bytes:
+        """
+        :return: the neighbor advertisement of target, sent to the soliciting host
+        """
+        frame, partial = self.template(target)
+        frame[0:6] = eth_dst
+        frame[IPV6_DST] = ipv6_dst
+        checksum = partial + _sum_words(ipv6_dst)
+        while checksum >> 16:
+            checksum = (checksum & 0xFFFF) + (checksum >> 16)
+        frame[ICMPV6_CHECKSUM] = struct.pack('!H', ~checksum & 0xFFFF)
+        return bytes(frame)
+
+    def answer(self, data: bytes) -> Optional[bytes]:
+        """
+        :return: the advertisement answering a neighbor solicitation, None if data is no solicitation
+        """
+        solicitation = self.parse_solicitation(data)
+        if solicitation is None:
+            return None
+        eth_src, ipv6_src, target = solicitation
+        return self.advertisement(eth_src, ipv6_src, target)
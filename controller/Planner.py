@@ -0,0 +1,97 @@
+import utils.SetCover
+from utils.FlowFile import iter_flows, write_flows
+from utils.FlowGenerator import generate_flow_index
+from utils.FlowIndex import FlowIndex
+from utils.SetCoverCache import SetCoverCache
+from utils.TopologyBundle import TopologyBundle
+from .RulePlan import RulePlan
+
+# Planning runs in worker processes that know nothing about the Ryu config, so the options are handed over as a dict.
+PLANNING_OPTIONS = ['num_flows', 'seed', 'max_path_length', 'cookie_mask', 'set_cover_engine', 'set_cover_workers',
+                    'set_cover_part_flows', 'set_cover_budget', 'switch_capacity', 'switch_capacity_bytes',
+                    'cache_dir', 'cache_max_mb']
+
+
+def plan_flows(options: dict, topology_file: str = 'topology.bundle',
+               flows_file: str = 'random_flows.bin') -> (FlowIndex, RulePlan):
+    """
+    Generates the random flows, writes them to the flow file for mininet and precomputes the rules of every switch.
+    :param options: values of PLANNING_OPTIONS
+    :return: the flow index and the rule plan built on it
+    """
+    bundle = TopologyBundle(topology_file)
+    max_path_length = options['max_path_length'] or None
+    flow_index = generate_flow_index(options['num_flows'], bundle.to_networkx(), seed=options['seed'],
+                                     max_path_length=max_path_length)
+    write_flows(flows_file, flow_index.flows.items())
+    rule_plan = RulePlan(flow_index, bundle.switch_switch_port, bundle.switch_host_port)
+    return flow_index, rule_plan
+
+
+def load_flows(topology_file: str = 'topology.bundle', flows_file: str = 'random_flows.bin') -> (FlowIndex, RulePlan):
+    """
+    Reads the flows another controller planned, e.g. the coordinator of a sharded run, and builds the same rule plan.
+    :return: the flow index and the rule plan built on it
+    """
+    bundle = TopologyBundle(topology_file)
+    flow_index = FlowIndex.from_flows(iter_flows(flows_file))
+    rule_plan = RulePlan(flow_index, bundle.switch_switch_port, bundle.switch_host_port)
+    return flow_index, rule_plan
+
+
+def plan_polling(flow_index: FlowIndex, options: dict) -> dict[int, [int]]:
+    """
+    Transforms the flows into set cover input and solves it, or takes the solution from the cache.
+    :param options: values of PLANNING_OPTIONS
+    :return: a dict: switch id -> flows to poll
+    """
+    flows = list(flow_index.flows.keys())
+    switch_flows = flow_index.switch_flows
+
+    if options['cookie_mask']:
+        # one masked request per polled switch: only the flows a switch newly covers add to its cost
+        engine = 'aggregated'
+        weight_fn = utils.SetCover.weight_aggregated
+    else:
+        engine = options['set_cover_engine']
+        weight_fn = utils.SetCover.weight
+    workers = options['set_cover_workers']
+    part_flows = options['set_cover_part_flows']
+    budget = options['set_cover_budget']
+    capacity = options['switch_capacity']
+    if options['switch_capacity_bytes'] > 0:
+        capacity = utils.SetCover.capacity_from_bytes(options['switch_capacity_bytes'], weight_fn)
+
+    cache = None
+    if options['cache_dir']:
+        cache = SetCoverCache(options['cache_dir'], options['cache_max_mb'] * 2**20)
+        solver = f'{engine}|partitioned={workers > 0}|part_flows={part_flows}|budget={budget}|capacity={capacity}'
+        key = cache.key(flow_index.flows, switch_flows, weight_fn.__name__, solver)
+        polling = cache.get(key)
+        print(f'Set cover cache {"hit" if polling is not None else "miss"} '
+              f'({cache.hits} hits, {cache.misses} misses in total)')
+        if polling is not None:
+            return polling
+
+    if capacity > 0:
+        # spread polling over the switches instead of letting hub switches answer most requests
+        print(f'Solving set cover with at most {capacity} flows per switch')
+        polling = utils.SetCover.set_cover_solve_capacitated(flows, switch_flows, capacity, weight_fn)
+        print(f'Per-switch load histogram (flows: switches): {utils.SetCover.load_histogram(polling)}')
+    elif workers > 0:
+        print(f'Solving set cover with the {engine} engine')
+        polling = utils.SetCover.set_cover_solve_partitioned(flows, switch_flows, engine, workers, part_flows)
+    else:
+        print(f'Solving set cover with the {engine} engine')
+        polling = utils.SetCover.SET_COVER_ENGINES[engine](flows, switch_flows)
+    if budget > 0 and capacity > 0:
+        print('Skipping the anytime improvement, it does not respect switch capacities.')
+    elif budget > 0:
+        # spend a few seconds of startup on a permanently cheaper polling plan
+        polling, _, _ = utils.SetCover.set_cover_solve_anytime(flows, switch_flows, budget, initial=polling,
+                                                               weight_fn=weight_fn)
+    # plain lists: engines may hand out views into the flow index, which cannot leave the planner process
+    polling = {switch_id: list(flows) for switch_id, flows in polling.items()}
+    if cache is not None:
+        cache.put(key, polling)
+    return polling
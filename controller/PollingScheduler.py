@@ -0,0 +1,154 @@
+import heapq
+from typing import Iterable, Optional
+
+from utils.CookieAllocator import CookieAllocator
+
+PollKey = tuple[int, int, int] # (switch id, cookie, cookie mask) of one stats request
+
+
+class PollingScheduler:
+    """
+    Decides which stats requests are due instead of sweeping all of them every round.
+    Every request, i.e. a flow (exact cookies) or the flow group of a switch (masked cookies), has its own interval:
+    when a poll sees its byte counts change the interval halves down to min_interval, so elephants are polled often;
+    when nothing changed it doubles up to max_interval, so idle and finished flows back off exponentially.
+    Due requests come out of a priority queue ordered by due time, at most budget per second in total.
+    With adaptive=False every request keeps the initial interval, which is the fixed sweep.
+    """
+
+    def __init__(self, cookies: CookieAllocator, switch_ids: Iterable[int], interval: float = 3.0,
+                 min_interval: float = 1.0, max_interval: float = 30.0, budget: float = 0.0, adaptive: bool = True,
+                 now: float = 0.0):
+        """
+        :param cookies: the requests of every switch
+        :param switch_ids: switches with requests
+        :param interval: initial interval of every request in seconds
+        :param min_interval: shortest interval of changing requests
+        :param max_interval: longest interval of unchanged requests
+        :param budget: max requests per second over all switches, 0 for unlimited
+        :param adaptive: adapt the intervals, otherwise poll everything every interval seconds
+        :param now: time of the first poll
+        """
+        self.min_interval = min(min_interval, interval)
+        self.max_interval = max(max_interval, interval)
+        self.budget = budget
+        self.adaptive = adaptive
+        self.interval: dict[PollKey, float] = {}
+        self.scheduled: dict[PollKey, float] = {}  # request -> due time; heap entries with another time are stale
+        self.heap: [(float, PollKey)] = []
+        for switch_id in switch_ids:
+            for cookie, cookie_mask in cookies.requests(switch_id):
+                key = (switch_id, cookie, cookie_mask)
+                self.interval[key] = interval
+                self.schedule(key, now)
+        self.tokens = budget
+        self.last_refill = now
+        self.requests_sent = 0
+
+    def schedule(self, key: PollKey, due: float) -> None:
+        self.scheduled[key] = due
+        heapq.heappush(self.heap, (due, key))
+
+    def next_due(self) -> Optional[float]:
+        """
+        :return: the earliest due time, None if nothing is scheduled
+        """
+        while self.heap and self.scheduled.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def due(self, now: float, online: Iterable[int]) -> dict[int, [(int, int)]]:
+        """
+        Takes the due requests of online switches out of the queue, earliest first, within the budget.
+        Requests of offline switches are postponed by their interval. Every request handed out must be passed back
+        to feedback or retry.
+        :return: a dict: switch id -> list of (cookie, cookie mask) to request now
+        """
+        if self.budget > 0:
+            # token bucket, bursts of at most one second worth of requests but always room for a whole one,
+            # otherwise a budget below one request per second would never send anything
+            self.tokens = min(max(self.budget, 1), self.tokens + (now - self.last_refill) * self.budget)
+            self.last_refill = now
+        online = set(online)
+        requests = {}
+        while True:
+            due = self.next_due()
+            if due is None or due > now or (self.budget > 0 and self.tokens < 1):
+                break
+            _, key = heapq.heappop(self.heap)
+            del self.scheduled[key]
+            switch_id, cookie, cookie_mask = key
+            if switch_id not in online:
+                self.schedule(key, now + self.interval[key])
+                continue
+            requests.setdefault(switch_id, []).append((cookie, cookie_mask))
+            self.tokens -= 1
+            self.requests_sent += 1
+        return requests
+
+    def feedback(self, key: PollKey, changed: bool, now: float) -> None:
+        """
+        Adapts the interval of an answered request and schedules its next poll.
+        :param changed: whether any byte count of the request changed since its last poll
+        """
+        if self.adaptive:
+            if changed:
+                self.interval[key] = max(self.min_interval, self.interval[key] / 2)
+            else:
+                self.interval[key] = min(self.max_interval, self.interval[key] * 2)
+        self.schedule(key, now + self.interval[key])
+
+    def retry(self, key: PollKey, now: float) -> None:
+        """
+        Schedules a request that was not answered again, keeping its interval.
+        """
+        self.schedule(key, now + self.interval[key])
+
+    def report(self) -> str:
+        intervals = sorted(self.interval.values())
+        if not intervals:
+            return 'no requests scheduled'
+        return (f'{len(intervals)} requests scheduled, interval median {intervals[len(intervals) // 2]:.1f}s '
+                f'max {intervals[-1]:.1f}s, {self.requests_sent} requests sent')
+
+
+class StabilityWindow:
+    """
+    Decides when the flow stats converged: no round changed more than threshold flows for window seconds, and every
+    request was answered at least once in that time. Rounds only carry the requests due, so counting rounds would let
+    a few cheap partial rounds stand in for observed stability; requests that backed off have to be seen as well.
+    Stability only starts once some flow carried traffic.
+    """
+
+    def __init__(self, keys: Iterable[PollKey], window: float, threshold: int = 0, now: float = 0.0):
+        """
+        :param keys: every request
+        :param window: seconds without changes
+        :param threshold: changed flows a round may have and still count as unchanged
+        :param now: time polling starts
+        """
+        self.keys = set(keys)
+        self.window = window
+        self.threshold = threshold
+        self.since = now  # start of the current stable period
+        self.confirmed: set[PollKey] = set()  # requests answered since then
+
+    def record(self, answered: Iterable[PollKey], num_changed: int, active: bool, now: float) -> None:
+        """
+        Accounts a finished round.
+        :param answered: the requests the round answered
+        :param num_changed: flows the round changed
+        :param active: whether any flow carried traffic so far
+        """
+        if not active or num_changed > self.threshold:
+            self.since = now
+            self.confirmed.clear()
+            return
+        self.confirmed.update(answered)
+
+    def converged(self, now: float) -> bool:
+        return now - self.since >= self.window and self.keys <= self.confirmed
+
+    def report(self, now: float) -> str:
+        return (f'stable for {now - self.since:.1f}s of {self.window:.1f}s, '
+                f'{len(self.keys & self.confirmed)}/{len(self.keys)} requests answered since')
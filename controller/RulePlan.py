@@ -0,0 +1,191 @@
+from collections.abc import Mapping
+from typing import Iterator, NamedTuple, Optional
+
+import numpy as np
+
+from utils.FlowIndex import FlowIndex
+from utils.HostIdIPConverter import id_to_ip
+
+FORWARDING_PRIORITY = 2
+COUNTING_PRIORITY = 3 # also used by flabel overrides of flows that lost their (src, dst) forwarding rule
+
+
+class Rule(NamedTuple):
+    """
+    One flow entry to install on a switch.
+    The match is eth_type IPv6, ipv6_src and ipv6_dst, plus ipv6_flabel for per-flow rules.
+    """
+    flow_id: int
+    position: int # index of the switch on the path in the direction of the rule
+    priority: int
+    ipv6_src: str
+    ipv6_dst: str
+    ipv6_flabel: Optional[int] # flow id for per-flow rules, None for (src, dst) forwarding rules
+    out_port: int
+    count_stats: bool # per-flow rule read by request_stats, False for overrides that only forward
+
+
+def port_lookup(switch_switch_port: Mapping[(int, int), int]) -> (np.ndarray, np.ndarray):
+    """
+    :return: sorted (from << 32 | to) keys and the ports they map to, for vectorized lookups with searchsorted
+    """
+    pairs = np.array(list(switch_switch_port.keys()), dtype=np.int64).reshape(-1, 2)
+    keys = pairs[:, 0] << 32 | pairs[:, 1]
+    ports = np.fromiter((switch_switch_port[pair] for pair in switch_switch_port.keys()), dtype=np.int64, count=len(keys))
+    order = np.argsort(keys)
+    return keys[order], ports[order]
+
+
+class RulePlan:
+    """
+    Rules of every switch, precomputed once after flow generation so a connecting switch only walks its own flows.
+    Forwarding rules only match the (src, dst) subnets, so all flows between two hosts share them. They are compiled
+    once per (switch, src, dst): the lowest flow id wins, forward direction before reverse, and every other flow that
+    needs the same match is deduplicated away. A flow whose forward out port differs from the winner's is a conflict
+    and keeps its own path through a per-flow flabel override; conflicting reverse rules are only reported.
+    The counting rule in the forward direction only goes where the flow is polled once set_polling is called;
+    until then it goes on every switch of the path.
+    The plan is stored in the CSR layout of FlowIndex.switch_flow_ids: for the i-th (switch, flow) entry,
+        position[i]          index of the switch on the forward path
+        out_port[i]          port towards the next switch, or the host at the end of the path
+        reverse_out_port[i]  port towards the previous switch, or the host at the start of the path
+        forward_rule[i]      whether the entry emits the (src, dst) forwarding rule of its switch
+        reverse_rule[i]      whether the entry emits the (dst, src) forwarding rule of its switch
+        override[i]          whether the flow needs a flabel override because its forwarding rule lost
+        counted[i]           whether the switch gets the counting rule of the flow
+    Rule tuples are only materialized per switch, when it connects.
+    """
+
+    def __init__(self, flow_index: FlowIndex, switch_switch_port: Mapping[(int, int), int],
+                 switch_host_port: Mapping[(int, int), int]):
+        """
+        :param flow_index: flows and the switches they pass
+        :param switch_switch_port: (switch id from, to) -> port id
+        :param switch_host_port: (switch id, host id) -> port id
+        """
+        self.flow_index = flow_index
+        flow_ptr = np.frombuffer(flow_index.flow_ptr, dtype=np.uint64).astype(np.int64)
+        switches = np.frombuffer(flow_index.flow_switches, dtype=np.uint32).astype(np.int64) \
+            if flow_index.flow_switches else np.zeros(0, dtype=np.int64)
+        lengths = np.diff(flow_ptr)
+        starts = np.repeat(flow_ptr[:-1], lengths)
+        ends = np.repeat(flow_ptr[1:], lengths)
+        entries = np.arange(len(switches))
+        is_first = entries == starts
+        is_last = entries == ends - 1
+
+        keys, ports = port_lookup(switch_switch_port)
+        host_ports = {s: switch_host_port[(s, s)] for s in np.unique(switches).tolist()}
+
+        def lookup(neighbors: np.ndarray, at_host: np.ndarray) -> np.ndarray:
+            out = np.empty(len(switches), dtype=np.int64)
+            inner = ~at_host
+            wanted = switches[inner] << 32 | neighbors[inner]
+            found = np.searchsorted(keys, wanted)
+            if np.any(found >= len(keys)) or np.any(keys[np.minimum(found, len(keys) - 1)] != wanted):
+                raise KeyError('flow path uses a link missing from the topology')
+            out[inner] = ports[found]
+            out[at_host] = [host_ports[s] for s in switches[at_host].tolist()]
+            return out
+
+        out_port = lookup(np.roll(switches, -1), is_last)
+        reverse_out_port = lookup(np.roll(switches, 1), is_first)
+
+        # same stable sort FlowIndex uses to build switch_flow_ids
+        order = np.argsort(switches, kind='stable')
+        self.position = (entries - starts)[order].astype(np.int32)
+        self.out_port = out_port[order].astype(np.int32)
+        self.reverse_out_port = reverse_out_port[order].astype(np.int32)
+        self.counted = np.ones(len(switches), dtype=bool)
+        self.subnets = {}
+
+        flow_ids = np.repeat(np.frombuffer(flow_index.flow_ids, dtype=np.uint32).astype(np.int64), lengths)
+        self.compile_forwarding(switches[order], switches[starts][order], switches[ends - 1][order], flow_ids[order])
+
+    def compile_forwarding(self, switches: np.ndarray, first: np.ndarray, last: np.ndarray,
+                           flow_ids: np.ndarray) -> None:
+        """
+        Picks one forwarding rule per (switch, src, dst) match and finds the flows that conflict with it.
+        All arguments are aligned with the plan entries.
+        """
+        n = len(switches)
+        # host ids are below 2 ** 16 (see id_to_ip), so a match fits into one int64 key
+        keys = np.concatenate([switches << 32 | first << 16 | last, switches << 32 | last << 16 | first])
+        ports = np.concatenate([self.out_port, self.reverse_out_port])
+        direction = np.repeat(np.array([0, 1], dtype=np.int8), n)
+        order = np.lexsort((direction, np.concatenate([flow_ids, flow_ids]), keys))
+        sorted_keys = keys[order]
+        group_start = np.ones(2 * n, dtype=bool)
+        group_start[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        winner = np.zeros(2 * n, dtype=bool)
+        winner[order[group_start]] = True
+        winner_port = ports[order][group_start][np.cumsum(group_start) - 1]
+        conflict = np.zeros(2 * n, dtype=bool)
+        conflict[order] = ports[order] != winner_port
+        self.forward_rule = winner[:n]
+        self.reverse_rule = winner[n:]
+        self.override = conflict[:n]
+        self.num_conflicting_matches = len(np.unique(keys[conflict]))
+        self.num_unresolved_conflicts = int(conflict[n:].sum())
+
+    def set_polling(self, polling: dict[int, [int]]) -> None:
+        """
+        Restricts counting rules to the switches a flow is polled on; transit switches only forward.
+        :param polling: switch id -> flows to poll, as returned by set cover
+        """
+        index = self.flow_index
+        self.counted[:] = False
+        for switch_id, polled_flows in polling.items():
+            if not polled_flows or switch_id not in index.switch_flows:
+                continue
+            row = index._switch_row[switch_id]
+            start, end = index.switch_ptr[row], index.switch_ptr[row + 1]
+            flow_ids = np.frombuffer(index.switch_flow_ids, dtype=np.uint32)[start:end]
+            self.counted[start:end] = np.isin(flow_ids, np.fromiter(polled_flows, dtype=np.int64))
+
+    def subnet(self, switch_id: int) -> str:
+        if switch_id not in self.subnets:
+            self.subnets[switch_id] = f'{id_to_ip(switch_id)}/64'
+        return self.subnets[switch_id]
+
+    def rules(self, switch_id: int, forwarding: bool = True, counting: bool = True) -> Iterator[Rule]:
+        """
+        :param forwarding: include the forwarding rules and overrides, which do not depend on the polling
+        :param counting: include the counting rules, which replace the override of a flow where both are needed
+        :return: the rules to install on a switch, in flow id order: the forwarding rules the flow won,
+            followed by its counting rule if the flow is counted there or its override if it lost a conflict
+        """
+        index = self.flow_index
+        if switch_id not in index.switch_flows:
+            return
+        row = index._switch_row[switch_id]
+        start, end = index.switch_ptr[row], index.switch_ptr[row + 1]
+        flow_ids = index.switch_flow_ids[start:end]
+        for i, flow_id in enumerate(flow_ids, start):
+            path = index.path(flow_id)
+            first_ip, last_ip = self.subnet(path[0]), self.subnet(path[-1])
+            position = int(self.position[i])
+            out_port = int(self.out_port[i])
+            if forwarding and self.forward_rule[i]:
+                yield Rule(flow_id, position, FORWARDING_PRIORITY, first_ip, last_ip, None, out_port, False)
+            if forwarding and self.reverse_rule[i]:
+                yield Rule(flow_id, len(path) - 1 - position, FORWARDING_PRIORITY, last_ip, first_ip, None,
+                           int(self.reverse_out_port[i]), False)
+            counted = counting and self.counted[i]
+            if counted or (forwarding and self.override[i]):
+                yield Rule(flow_id, position, COUNTING_PRIORITY, first_ip, last_ip, flow_id, out_port, bool(counted))
+
+    def num_rules(self) -> int:
+        return int(self.forward_rule.sum() + self.reverse_rule.sum() + (self.counted | self.override).sum())
+
+    def report(self) -> str:
+        """
+        :return: a summary of the deduplication and the conflicts found
+        """
+        return (f'{self.num_rules()} rules ({2 * len(self.position)} forwarding rules before deduplication, '
+                f'{int(self.forward_rule.sum() + self.reverse_rule.sum())} after); '
+                f'{self.num_conflicting_matches} conflicting matches, {int(self.override.sum())} flabel overrides, '
+                f'{self.num_unresolved_conflicts} reverse rules overridden by other flows')
+
+    def nbytes(self) -> int:
+        return self.position.nbytes + self.out_port.nbytes + self.reverse_out_port.nbytes
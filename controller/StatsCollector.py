@@ -0,0 +1,211 @@
+from collections import deque
+from timeit import default_timer as timer
+from typing import Optional
+
+import ryu.ofproto.ofproto_v1_3 as ofproto
+from ryu.controller.controller import Datapath
+from ryu.ofproto.ofproto_v1_3_parser import OFPFlowStatsRequest
+
+from utils.CookieAllocator import CookieAllocator
+
+
+class StatsRequest:
+    """
+    One flow stats request of a polling round, possibly answered in several multipart replies.
+    """
+    __slots__ = ('datapath_id', 'cookie', 'cookie_mask', 'attempt', 'sent', 'parts')
+
+    def __init__(self, datapath_id: int, cookie: int, cookie_mask: int):
+        self.datapath_id = datapath_id
+        self.cookie = cookie
+        self.cookie_mask = cookie_mask
+        self.attempt = 0
+        self.sent = 0.0
+        self.parts: dict[int, int] = {}  # flow id -> byte count of changed counting rules, from the parts received so far
+
+
+class StatsRound:
+    """
+    Outcome of one polling round.
+    """
+
+    def __init__(self, number: int, num_requests: int):
+        self.number = number
+        self.num_requests = num_requests
+        self.start = timer()
+        self.end: Optional[float] = None
+        self.reported: dict[(int, int), int] = {}  # (switch id, flow id) -> byte count of changed counting rules
+        self.changed: dict[int, int] = {}  # flow id -> new byte count of the flows that changed, set once complete
+        self.answered: [(StatsRequest, bool)] = []  # answered requests and whether any of their flows changed
+        self.given_up: [StatsRequest] = []
+        self.rtts: [float] = []
+        self.retries = 0
+        self.failed = 0
+
+    def report(self) -> str:
+        rtts = sorted(self.rtts)
+        if rtts:
+            p50, p95 = rtts[len(rtts) // 2], rtts[min(len(rtts) - 1, int(len(rtts) * 0.95))]
+            latency = f'rtt p50 {p50 * 1000:.1f}ms p95 {p95 * 1000:.1f}ms max {rtts[-1] * 1000:.1f}ms'
+        else:
+            latency = 'no replies'
+        return (f'Stats round {self.number}: {len(rtts)}/{self.num_requests} requests answered in '
+                f'{(self.end or timer()) - self.start:.2f}s, {latency}, {self.retries} retries, {self.failed} failed')
+
+
+class StatsCollector:
+    """
+    Sends the stats requests of a polling round and correlates the replies by switch and xid; every switch counts
+    its own xids, so an xid alone can belong to requests on several switches.
+    Every switch has at most window requests in flight; the rest wait in a per-switch queue and are sent as replies
+    come back. Multipart replies are reassembled and only committed once the part without OFPMPF_REPLY_MORE arrived.
+    Requests unanswered after timeout seconds are resent up to max_retries times, then counted as failed.
+    A round is complete when every request was answered or failed. Only then are its changes applied to flow_stats,
+    so flow_stats is always a consistent snapshot. Replies are compared to switch_stats as they arrive, so a round
+    only carries the counting rules that changed (its dirty set) and applying it costs nothing for unchanged flows.
+    A flow may be polled on several switches whose counts differ for good, e.g. behind a lossy link. Every switch
+    is compared with its own last count, and flow_stats keeps the largest count seen for a flow, as merge_shard_stats
+    does across shards; otherwise the counts of the switches would take turns and the flow would never converge.
+    """
+
+    def __init__(self, cookies: CookieAllocator, window: int = 64, timeout: float = 2.0, max_retries: int = 3):
+        """
+        :param cookies: cookies of the counting rules, decides the requests per switch
+        :param window: max requests in flight per switch
+        :param timeout: seconds until an unanswered request is resent
+        :param max_retries: resends before a request is given up
+        """
+        self.cookies = cookies
+        self.window = window
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.datapaths: dict[int, Datapath] = {}
+        self.queued: dict[int, deque[StatsRequest]] = {}  # switch id -> requests not sent yet
+        self.outstanding: dict[(int, int), StatsRequest] = {}  # (switch id, xid) -> request in flight
+        self.inflight: dict[int, int] = {}  # switch id -> number of requests in flight
+        self.round: Optional[StatsRound] = None
+        self.num_rounds = 0
+        self.switch_stats: dict[(int, int), int] = {}  # (switch id, flow id) -> byte count, as of the last complete round
+        self.flow_stats: dict[int, int] = {}  # flow id -> largest byte count of its switches, as of the last complete round
+        self.version = 0  # number of complete rounds that changed flow_stats
+        self.active_flows = 0  # flows with a byte count above zero
+
+    def start_round(self, datapaths: dict[int, Datapath], requests: Optional[dict[int, list[(int, int)]]] = None) -> StatsRound:
+        """
+        Queues the requests of the given switches and sends the first window to each of them.
+        Requests still outstanding from the previous round are dropped.
+        :param requests: switch id -> list of (cookie, cookie mask) to request, all requests of every switch if None
+        """
+        self.outstanding.clear()
+        if requests is not None:
+            datapaths = {datapath_id: datapaths[datapath_id] for datapath_id in requests if datapath_id in datapaths}
+        self.datapaths = dict(datapaths)
+        self.queued = {}
+        self.inflight = {}
+        num_requests = 0
+        for datapath_id in self.datapaths:
+            pairs = self.cookies.requests(datapath_id) if requests is None else requests[datapath_id]
+            requests_of_switch = deque(StatsRequest(datapath_id, cookie, cookie_mask) for cookie, cookie_mask in pairs)
+            self.queued[datapath_id] = requests_of_switch
+            self.inflight[datapath_id] = 0
+            num_requests += len(requests_of_switch)
+        self.num_rounds += 1
+        self.round = StatsRound(self.num_rounds, num_requests)
+        for datapath_id in self.datapaths:
+            self._send_window(datapath_id)
+        self._finish_if_complete()
+        return self.round
+
+    def _send_window(self, datapath_id: int) -> None:
+        datapath = self.datapaths[datapath_id]
+        queued = self.queued[datapath_id]
+        while queued and self.inflight[datapath_id] < self.window:
+            request = queued.popleft()
+            req = OFPFlowStatsRequest(datapath, 0, ofproto.OFPTT_ALL, ofproto.OFPP_ANY, ofproto.OFPG_ANY,
+                                      request.cookie, request.cookie_mask)
+            datapath.set_xid(req)
+            request.sent = timer()
+            request.parts = {}
+            self.outstanding[(datapath_id, req.xid)] = request
+            self.inflight[datapath_id] += 1
+            datapath.send_msg(req)
+
+    def handle_reply(self, msg) -> None:
+        """
+        Feeds an EventOFPFlowStatsReply message; replies to unknown, retried or dropped requests are ignored.
+        """
+        key = (msg.datapath.id, msg.xid)
+        request = self.outstanding.get(key)
+        if request is None:
+            return
+        for stat in msg.body:
+            flow_id = self.cookies.flow_id(stat.cookie)
+            if flow_id is not None and self.switch_stats.get((request.datapath_id, flow_id)) != stat.byte_count:
+                request.parts[flow_id] = stat.byte_count
+        if msg.flags & ofproto.OFPMPF_REPLY_MORE:
+            return
+        del self.outstanding[key]
+        self.inflight[request.datapath_id] -= 1
+        self.round.reported.update(((request.datapath_id, flow_id), byte_count)
+                                   for flow_id, byte_count in request.parts.items())
+        self.round.answered.append((request, bool(request.parts)))
+        self.round.rtts.append(timer() - request.sent)
+        self._send_window(request.datapath_id)
+        self._finish_if_complete()
+
+    def check_timeouts(self) -> None:
+        """
+        Resends or gives up requests that waited longer than timeout.
+        """
+        now = timer()
+        for key, request in list(self.outstanding.items()):
+            if now - request.sent < self.timeout:
+                continue
+            del self.outstanding[key]
+            self.inflight[request.datapath_id] -= 1
+            if request.attempt < self.max_retries:
+                request.attempt += 1
+                self.round.retries += 1
+                self.queued[request.datapath_id].appendleft(request)
+            else:
+                self.round.failed += 1
+                self.round.given_up.append(request)
+            self._send_window(request.datapath_id)
+        self._finish_if_complete()
+
+    def forget(self, datapath_id: int) -> None:
+        """
+        Drops the requests of a switch that went offline; they count as failed.
+        """
+        if self.round is None or datapath_id not in self.datapaths:
+            return
+        dropped = [key for key, request in self.outstanding.items() if request.datapath_id == datapath_id]
+        for key in dropped:
+            self.round.given_up.append(self.outstanding.pop(key))
+        self.round.given_up.extend(self.queued[datapath_id])
+        self.round.failed += len(dropped) + len(self.queued[datapath_id])
+        self.queued[datapath_id].clear()
+        self.inflight[datapath_id] = 0
+        del self.datapaths[datapath_id]
+        self._finish_if_complete()
+
+    def round_complete(self) -> bool:
+        return self.round is not None and self.round.end is not None
+
+    def _finish_if_complete(self) -> None:
+        if self.round is None or self.round.end is not None:
+            return
+        if not self.outstanding and not any(self.queued.values()):
+            self.round.end = timer()
+            self.switch_stats.update(self.round.reported)
+            changed = self.round.changed
+            for (_, flow_id), byte_count in self.round.reported.items():
+                largest = changed.get(flow_id, self.flow_stats.get(flow_id))
+                if largest is None or byte_count > largest:
+                    changed[flow_id] = byte_count
+            for flow_id, byte_count in changed.items():
+                if byte_count > 0 and not self.flow_stats.get(flow_id):
+                    self.active_flows += 1
+            self.flow_stats.update(changed)
+            if changed:
+                self.version += 1
@@ -1,33 +1,49 @@
 #!/usr/bin/env bash
 
+# unseeded by default; set e.g. seed=1 to fix the topology, the lossy switches and the flows,
+# the set cover cache only hits when they are seeded
+seed=
+network_seed=${seed:+--seed=$seed}
+flowcover_seed=${seed:+--flowcover-seed=$seed}
+
 if [ "$1" = '5' ]; then
   # Reproduce Figure 5
-  python3 -m network.SimulatedNetwork --num-switches=200 --random-type=erdos-renyi --erdos-renyi-prob=0.1
+  python3 -m network.SimulatedNetwork --num-switches=200 --random-type=erdos-renyi --erdos-renyi-prob=0.1 $network_seed
   sleep 300
-  python3 -m controller.Controller --flowcover-num-flows=1000
-  python3 -m controller.Controller --flowcover-num-flows=10000
-  python3 -m controller.Controller --flowcover-num-flows=20000
-  python3 -m controller.Controller --flowcover-num-flows=30000
-  python3 -m controller.Controller --flowcover-num-flows=40000
-  python3 -m controller.Controller --flowcover-num-flows=50000
+  python3 -m controller.Controller --flowcover-num-flows=1000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=10000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=20000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=30000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=40000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=50000 $flowcover_seed
 elif [ "$1" = '7.1' ]; then
   # Reproduce Figure 7
-  python3 -m network.SimulatedNetwork --num-switches=200 --random-type=erdos-renyi --erdos-renyi-prob=0.1 --loss-switch-ratio=0.01 --packet-loss-ratio=0.1
+  python3 -m network.SimulatedNetwork --num-switches=200 --random-type=erdos-renyi --erdos-renyi-prob=0.1 --loss-switch-ratio=0.01 --packet-loss-ratio=0.1 $network_seed
   sleep 300
-  python3 -m controller.Controller --flowcover-num-flows=1000
-  python3 -m controller.Controller --flowcover-num-flows=10000
-  python3 -m controller.Controller --flowcover-num-flows=20000
-  python3 -m controller.Controller --flowcover-num-flows=30000
-  python3 -m controller.Controller --flowcover-num-flows=40000
-  python3 -m controller.Controller --flowcover-num-flows=50000
+  python3 -m controller.Controller --flowcover-num-flows=1000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=10000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=20000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=30000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=40000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=50000 $flowcover_seed
 elif [ "$1" = '7.2' ]; then
   # Reproduce Figure 5
-  python3 -m network.SimulatedNetwork --num-switches=200 --random-type=waxman --loss-switch-ratio=0.01 --packet-loss-ratio=0.1
+  python3 -m network.SimulatedNetwork --num-switches=200 --random-type=waxman --loss-switch-ratio=0.01 --packet-loss-ratio=0.1 $network_seed
+  sleep 300
+  python3 -m controller.Controller --flowcover-num-flows=1000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=10000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=20000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=30000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=40000 $flowcover_seed
+  python3 -m controller.Controller --flowcover-num-flows=50000 $flowcover_seed
+elif [ "$1" = '5-sharded' ]; then
+  # Figure 5 setup with the switches split over 4 controller processes; shard 0 plans for all and starts first
+  python3 -m network.SimulatedNetwork --num-switches=200 --random-type=erdos-renyi --erdos-renyi-prob=0.1 --num-controller-shards=4 $network_seed
   sleep 300
-  python3 -m controller.Controller --flowcover-num-flows=1000
-  python3 -m controller.Controller --flowcover-num-flows=10000
-  python3 -m controller.Controller --flowcover-num-flows=20000
-  python3 -m controller.Controller --flowcover-num-flows=30000
-  python3 -m controller.Controller --flowcover-num-flows=40000
-  python3 -m controller.Controller --flowcover-num-flows=50000
+  python3 -m controller.Controller --flowcover-num-flows=50000 $flowcover_seed --flowcover-num-shards=4 --flowcover-shard-id=0 --ofp-tcp-listen-port=6653 &
+  sleep 5
+  for shard in 1 2 3; do
+    python3 -m controller.Controller --flowcover-num-flows=50000 $flowcover_seed --flowcover-num-shards=4 --flowcover-shard-id=$shard --ofp-tcp-listen-port=$((6653 + shard)) &
+  done
+  wait
 fi
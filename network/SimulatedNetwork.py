@@ -17,8 +17,7 @@ import mininet.clean as m_clean
 from ipmininet.ipnet import IPNet
 from mininet.node import OVSSwitch, RemoteController
 from ipmininet.host import IPHost
-import pickle
-from random import sample
+from random import Random
 from math import floor, sqrt
 from typing import Optional, TextIO
 import os
@@ -26,11 +25,15 @@ import signal
 
 
 from utils import HostIdIPConverter
+from utils.FlowFile import read_flows
 from utils.GraphGenerator import *
+from utils.TopologyBundle import write_topology_bundle
+from utils.Sharding import BASE_CONTROLLER_PORT, shard_of, shard_port
 
 network: Optional[IPNet] = None
 NUM_BYTES_PER_FLOW = 1000
 BITRATE = '1MB'
+STATIC_NEIGHBORS = False
 trafgen_flag = False
 def port_id_generator():
     current_id = 1
@@ -49,7 +52,7 @@ class SimulatedNetworkTopology(IPTopo):
         Supports generating a random topology using Erdos-Renyi or Waxman.
     """
 
-    def build(self, n, random_type='linear', prob=0.5, waxman_alpha=0.5, waxman_beta=0.5, loss_switch_ratio=0, packet_loss_ratio=0, **_kwargs):
+    def build(self, n, random_type='linear', prob=0.5, waxman_alpha=0.5, waxman_beta=0.5, loss_switch_ratio=0, packet_loss_ratio=0, seed=None, **_kwargs):
         """
         Initializes a Mininet topology using given parameters.
         :param n: number of switches
@@ -57,6 +60,7 @@ class SimulatedNetworkTopology(IPTopo):
         :param prob: probability for erdos-renyi and waxman random graph generation
         :param loss_switch_ratio: percent of lossy switches, in float
         :param packet_loss_ratio: percent of packet loss on a lossy switch, in float
+        :param seed: seed of the random topology generation and of the lossy switch choice, random if None
         :return: None
         """
         ipm_clean.cleanup()
@@ -75,9 +79,9 @@ class SimulatedNetworkTopology(IPTopo):
         if random_type == 'linear':
             self.graph = linear_generator(n)
         elif random_type == 'erdos-renyi':
-            self.graph = erdos_renyi_generator(n, prob)
+            self.graph = erdos_renyi_generator(n, prob, seed)
         elif random_type == 'waxman':
-            self.graph = waxman_generator_1(n, waxman_alpha, waxman_beta)
+            self.graph = waxman_generator_1(n, waxman_alpha, waxman_beta, seed)
         else:
             raise NotImplementedError()
         print(self.graph)
@@ -87,7 +91,7 @@ class SimulatedNetworkTopology(IPTopo):
             self.graph.add_node(s)
         # pick lossy switches out using loss_switch_ratio
         num_lossy_switches = floor(n * loss_switch_ratio)
-        self.lossy_switches = sample(self.my_switches[1:], num_lossy_switches)
+        self.lossy_switches = Random(seed).sample(self.my_switches[1:], num_lossy_switches)
         # Mininet only allows configuring loss on links, not switches.
         # Workaround: if packet_loss_rate=p, apply sqrt(p) loss rate to every link it connects (including host link)
         # Then every packet would have the same loss rate p since it always passes 2 edges
@@ -122,17 +126,29 @@ class SimulatedNetworkTopology(IPTopo):
         super().build()
 
     def write_initial_topology(self, random_type: str):
-        nx.write_adjlist(self.graph, 'topology.bin')
-        with open('random_type.txt', 'w') as f:
-            f.write(random_type)
-        with open('switch_switch_port_id.bin', 'wb') as f:
-            pickle.dump(self.switch_switch_port, f)
-        with open('switch_host_port_id.bin', 'wb') as f:
-            pickle.dump(self.switch_host_port, f)
+        write_topology_bundle('topology.bundle', self.graph, random_type, self.switch_switch_port, self.switch_host_port)
 
 
 
 
+def add_static_neighbors(net: IPNet, flows: dict[int, [int]]) -> None:
+    """
+    Gives both ends of every flow a permanent neighbor entry for the other,
+    so they never send neighbor solicitations and the controller never has to answer them.
+    """
+    neighbors: dict[int, set[int]] = {}
+    for flow in flows.values():
+        neighbors.setdefault(flow[0], set()).add(flow[-1])
+        neighbors.setdefault(flow[-1], set()).add(flow[0])
+    for host_id, peers in neighbors.items():
+        # one ip process per host, reading all of its entries from stdin
+        commands = ''.join(f'neigh replace {HostIdIPConverter.id_to_ip(peer)} lladdr {HostIdIPConverter.id_to_mac(peer)} '
+                           f'dev h{host_id}-eth0 nud permanent\n' for peer in peers)
+        host: IPHost = net.get(f'h{host_id}')
+        host.popen(['ip', '-batch', '-'], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.STDOUT).communicate(commands.encode())
+    print(f'Static neighbor entries added on {len(neighbors)} hosts')
+
 def handle_signal_emulate_traffic(sig, frame):
     assert network is not None
     global trafgen_flag
@@ -151,7 +167,9 @@ def handle_signal_emulate_traffic(sig, frame):
     print('Starting trafgen')
     # read random flows from file
     with open('random_flows.bin', 'rb') as f:
-        flows: dict[int, [int]] = pickle.load(f)
+        flows: dict[int, [int]] = read_flows(f)
+        if STATIC_NEIGHBORS:
+            add_static_neighbors(network, flows)
         # prepare trafgen template
         with open('utils/trafgen.conf', 'r') as f:
             trafgen_conf_template = f.read()
@@ -285,7 +303,7 @@ def parse_flow_trafgen(flow_ids: [int]) -> dict[int, int]:
 def handle_signal_exit(sig, frame):
     print('Receiving signal from controller. Will exit after stats saved.')
     with open('random_flows.bin', 'rb') as f:
-        flows: dict[int, [int]] = pickle.load(f)
+        flows: dict[int, [int]] = read_flows(f)
         trafgen_stats = parse_flow_trafgen(flows.keys())
         pprint(trafgen_stats)
         filename = f"stats/trafgen_stats.json"
@@ -295,6 +313,16 @@ def handle_signal_exit(sig, frame):
         print('Stats saved. Mininet will exit.')
         sys.exit(0)
 
+def connect_switches_to_shards(net: IPNet, num_shards: int, base_port: int) -> None:
+    """
+    Points every switch at the controller shard owning it instead of the single controller.
+    """
+    for switch in net.switches:
+        switch_id = int(switch.name[1:])
+        port = shard_port(shard_of(switch_id, num_shards), base_port)
+        subprocess.run(['ovs-vsctl', 'set-controller', switch.name, f'tcp:127.0.0.1:{port}'], check=True)
+    print(f'Switches split over {num_shards} controller shards on ports {base_port}-{base_port + num_shards - 1}')
+
 def main():
     parser = argparse.ArgumentParser(description='Simulated Mininet network')
     parser.add_argument('--num-switches', default=20, type=int)
@@ -306,13 +334,19 @@ def main():
     parser.add_argument('--packet-loss-ratio', default=0, type=float)
     parser.add_argument('--num-bytes-sent', default=1000, type=int)
     parser.add_argument('--bitrate', default='1MB', type=str)
+    parser.add_argument('--seed', default=None, type=int)
+    parser.add_argument('--num-controller-shards', default=1, type=int)
+    parser.add_argument('--controller-base-port', default=BASE_CONTROLLER_PORT, type=int)
+    parser.add_argument('--static-neighbors', action='store_true',
+                        help='add neighbor entries for the flow ends, for controllers run with --flowcover-ndp-mode static')
 
     args = parser.parse_args()
     setLogLevel('debug')
     global network
-    global NUM_BYTES_PER_FLOW, BITRATE
+    global NUM_BYTES_PER_FLOW, BITRATE, STATIC_NEIGHBORS
     NUM_BYTES_PER_FLOW = args.num_bytes_sent
     BITRATE = args.bitrate
+    STATIC_NEIGHBORS = args.static_neighbors
     network = IPNet(
         topo=SimulatedNetworkTopology(
             n=args.num_switches,
@@ -322,10 +356,11 @@ def main():
             waxman_beta=args.waxman_beta,
             loss_switch_ratio=args.loss_switch_ratio,
             packet_loss_ratio=args.packet_loss_ratio,
+            seed=args.seed,
         ),
         allocate_IPs=False,
         switch=OVSSwitch,
-        controller=lambda name: RemoteController(name, ip='127.0.0.1', port=6653, protocols="OpenFlow13")
+        controller=lambda name: RemoteController(name, ip='127.0.0.1', port=args.controller_base_port, protocols="OpenFlow13")
     )
 
     #controller = RemoteController('c1', ip='127.0.0.1', port=6633, protocols="OpenFlow13")
@@ -335,6 +370,8 @@ def main():
         # write mininet pid to file; Ryu uses this to notify mininet to start sending traffic
         f.write(str(os.getpid()))
     network.start()
+    if args.num_controller_shards > 1:
+        connect_switches_to_shards(network, args.num_controller_shards, args.controller_base_port)
     with open(f'/tmp/mininet_started.flag', 'w', encoding='utf-8') as f:
         f.write('0')
     print('mininet started')
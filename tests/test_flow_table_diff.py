@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('netaddr')
+
+from controller.FlowTableDiff import diff_flow_table, normalize_field
+
+
+def rule(match: dict, cookie: int = 1, port: int = 1, priority: int = 2, table_id: int = 0) -> SimpleNamespace:
+    # stands in for both an OFPFlowMod and an OFPFlowStats, diff_flow_table only reads these attributes
+    actions = [SimpleNamespace(port=port)]
+    return SimpleNamespace(table_id=table_id, priority=priority, match=match, cookie=cookie,
+                           instructions=[SimpleNamespace(actions=actions)])
+
+
+def test_switch_normalized_addresses_match_what_was_sent():
+    assert normalize_field('ipv6_dst', '2001:db8:1:a::1/64') == \
+           normalize_field('ipv6_dst', ('2001:db8:1:a::', 'ffff:ffff:ffff:ffff::'))
+    assert normalize_field('ipv6_dst', '2001:db8:1:a::1') == normalize_field('ipv6_dst', '2001:db8:1:a::1/128')
+    assert normalize_field('eth_dst', '24:CD:AB:CD:AB:CD') == '24:cd:ab:cd:ab:cd'
+    assert normalize_field('ipv6_flabel', (0x12345, 0xff)) == (0x45, 0xff)
+
+
+def test_diff_sorts_rules_into_missing_changed_and_unchanged():
+    planned = [rule({'ipv6_dst': '2001:db8:1:1::1/64'}), rule({'ipv6_dst': '2001:db8:1:2::1/64'}),
+               rule({'ipv6_dst': '2001:db8:1:3::1/64'}, port=3), rule({'ipv6_flabel': 7}, cookie=7, priority=3)]
+    installed = [rule({'ipv6_dst': ('2001:db8:1:1::', 'ffff:ffff:ffff:ffff::')}),
+                 rule({'ipv6_dst': '2001:db8:1:3::/64'}, port=4), rule({'ipv6_flabel': 7}, cookie=8, priority=3)]
+    diff = diff_flow_table(planned, installed)
+    assert diff.unchanged == 1
+    assert diff.missing == [planned[1]]
+    assert diff.changed == [planned[2], planned[3]]
+    assert diff.extra == []
+
+
+def test_only_owned_entries_are_removed():
+    planned = [rule({'ipv6_dst': '2001:db8:1:1::1/64'})]
+    stale = rule({'ipv6_dst': '2001:db8:1:9::1/64'})
+    foreign = rule({'eth_type': 0x0806}, cookie=100000000000, priority=1)
+    diff = diff_flow_table(planned, [planned[0], stale, foreign], owned=lambda entry: entry.priority in (2, 3))
+    assert diff.extra == [stale]
+    assert diff.report() == '1 rules unchanged, 0 missing, 0 changed, 1 to remove'
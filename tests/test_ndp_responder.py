@@ -0,0 +1,59 @@
+import ipaddress
+import struct
+
+from controller.NdpResponder import NdpResponder, _mac_to_bin, _sum_words
+from utils.HostIdIPConverter import id_to_ip, id_to_mac
+
+HOST_MAC = _mac_to_bin('02:00:00:00:00:05')
+HOST_IP = ipaddress.IPv6Address(id_to_ip(5)).packed
+TARGET_IP = ipaddress.IPv6Address(id_to_ip(9)).packed
+
+
+def solicitation(target: bytes) -> bytes:
+    solicited_node = ipaddress.IPv6Address('ff02::1:ff00:0').packed[:13] + target[13:]
+    icmp = struct.pack('!BBHI', 135, 0, 0, 0) + target + struct.pack('!BB', 1, 1) + HOST_MAC
+    return (b'\x33\x33' + solicited_node[12:] + HOST_MAC + b'\x86\xdd'
+            + struct.pack('!IHBB', 0x60000000, len(icmp), 58, 255) + HOST_IP + solicited_node + icmp)
+
+
+def checksum_ok(frame: bytes) -> bool:
+    ipv6 = frame[14:54]
+    payload = frame[54:]
+    total = _sum_words(ipv6[8:40]) + len(payload) + 58 + _sum_words(payload)
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return total == 0xFFFF
+
+
+def test_answers_a_solicitation_with_an_advertisement_to_the_host():
+    frame = NdpResponder().answer(solicitation(TARGET_IP))
+    assert frame[0:6] == HOST_MAC
+    assert frame[6:12] == _mac_to_bin(id_to_mac(9))
+    assert frame[22:38] == TARGET_IP
+    assert frame[38:54] == HOST_IP
+    assert frame[54] == 136
+    assert frame[62:78] == TARGET_IP
+    assert frame[80:86] == _mac_to_bin(id_to_mac(9))
+    assert checksum_ok(frame)
+
+
+def test_reused_template_is_patched_for_every_host():
+    responder = NdpResponder()
+    first = responder.answer(solicitation(TARGET_IP))
+    other_ip = ipaddress.IPv6Address(id_to_ip(6)).packed
+    other = bytearray(solicitation(TARGET_IP))
+    other[22:38] = other_ip
+    second = responder.answer(bytes(other))
+    assert len(responder.templates) == 1
+    assert first[38:54] == HOST_IP and second[38:54] == other_ip
+    assert checksum_ok(first) and checksum_ok(second)
+
+
+def test_ignores_everything_but_solicitations():
+    responder = NdpResponder()
+    advertisement = bytearray(solicitation(TARGET_IP))
+    advertisement[54] = 136
+    assert responder.answer(bytes(advertisement)) is None
+    assert responder.answer(solicitation(TARGET_IP)[:60]) is None
+    arp = bytes(12) + b'\x08\x06' + bytes(28)
+    assert responder.answer(arp) is None
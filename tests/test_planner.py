@@ -0,0 +1,59 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import networkx as nx
+import pytest
+
+from controller.Planner import PLANNING_OPTIONS, plan_flows, plan_polling
+from utils.TopologyBundle import write_topology_bundle
+
+# defaults of the matching --flowcover-* options in controller.Controller.main
+DEFAULT_OPTIONS = {
+    'num_flows': 50,
+    'seed': None,
+    'max_path_length': 0,
+    'cookie_mask': False,
+    'set_cover_engine': 'heapq',
+    'set_cover_workers': 0,
+    'set_cover_part_flows': 50000,
+    'set_cover_budget': 0,
+    'switch_capacity': 0,
+    'switch_capacity_bytes': 0,
+    'cache_dir': '',
+    'cache_max_mb': 256,
+}
+
+
+@pytest.fixture
+def topology_file(tmp_path):
+    graph = nx.path_graph(range(1, 9))
+    switch_switch_port = {}
+    port = 100
+    for a, b in graph.edges:
+        switch_switch_port[(a, b)] = port
+        switch_switch_port[(b, a)] = port + 1
+        port += 2
+    switch_host_port = {(s, s): s for s in graph.nodes}
+    filename = str(tmp_path / 'topology.bundle')
+    write_topology_bundle(filename, graph, 'linear', switch_switch_port, switch_host_port)
+    return filename
+
+
+def test_options_cover_planning_options():
+    assert sorted(DEFAULT_OPTIONS) == sorted(PLANNING_OPTIONS)
+
+
+@pytest.mark.parametrize('cache', [False, True])
+def test_plan_polling_in_spawn_worker(topology_file, tmp_path, cache):
+    options = dict(DEFAULT_OPTIONS, cache_dir=str(tmp_path / 'cache') if cache else '')
+    flow_index, rule_plan = plan_flows(options, topology_file, str(tmp_path / 'random_flows.bin'))
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as planner:
+        # a second run hits the cache when it is enabled
+        for _ in range(2 if cache else 1):
+            polling = planner.submit(plan_polling, flow_index, options).result()
+            assert all(type(flows) is list for flows in polling.values())
+            polled = {flow_id for flows in polling.values() for flow_id in flows}
+            assert polled == set(flow_index.flows.keys())
+            for switch_id, flows in polling.items():
+                assert set(flows) <= set(flow_index.switch_flows[switch_id])
+    rule_plan.set_polling(polling)
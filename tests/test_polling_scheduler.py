@@ -0,0 +1,89 @@
+import pytest
+
+from controller.PollingScheduler import PollingScheduler, StabilityWindow
+from utils.CookieAllocator import CookieAllocator
+
+POLLING = {1: [1, 2], 2: [3], 3: [4, 5, 6]}
+
+
+def scheduler(**kwargs) -> PollingScheduler:
+    return PollingScheduler(CookieAllocator(POLLING), POLLING.keys(), **kwargs)
+
+
+def run(s: PollingScheduler, seconds: float, step: float = 0.05) -> int:
+    """
+    Polls like _monitor for the given time, answering every request without a change.
+    :return: number of requests sent
+    """
+    sent = 0
+    now = 0.0
+    while now < seconds:
+        for switch_id, requests in s.due(now, POLLING.keys()).items():
+            for cookie, cookie_mask in requests:
+                s.feedback((switch_id, cookie, cookie_mask), False, now)
+                sent += 1
+        now += step
+    return sent
+
+
+def test_due_returns_all_requests_initially():
+    s = scheduler()
+    assert s.due(0.0, POLLING.keys()) == {switch_id: [(flow, 0xFFFFFFFFFFFFFFFF) for flow in flows]
+                                          for switch_id, flows in POLLING.items()}
+    assert s.due(0.0, POLLING.keys()) == {}
+    assert s.requests_sent == 6
+
+
+def test_due_postpones_offline_switches():
+    s = scheduler(interval=3.0)
+    assert set(s.due(0.0, [1, 3])) == {1, 3}
+    assert s.due(1.0, [1, 2, 3]) == {}
+    assert set(s.due(3.0, [1, 2, 3])) == {2}
+
+
+def test_feedback_adapts_interval():
+    s = scheduler(interval=4.0, min_interval=1.0, max_interval=16.0)
+    s.due(0.0, POLLING.keys())
+    s.feedback((1, 1, 0xFFFFFFFFFFFFFFFF), True, 0.0)
+    s.feedback((1, 2, 0xFFFFFFFFFFFFFFFF), False, 0.0)
+    assert s.interval[(1, 1, 0xFFFFFFFFFFFFFFFF)] == 2.0
+    assert s.interval[(1, 2, 0xFFFFFFFFFFFFFFFF)] == 8.0
+    assert s.due(2.0, POLLING.keys()) == {1: [(1, 0xFFFFFFFFFFFFFFFF)]}
+
+
+def test_fixed_interval_without_adaptation():
+    s = scheduler(interval=3.0, adaptive=False)
+    assert run(s, 30.0) == 6 * 10
+
+
+@pytest.mark.parametrize('budget', [0.5, 2.0])
+def test_budget_limits_rate(budget):
+    s = scheduler(interval=1.0, min_interval=1.0, max_interval=1.0, budget=budget)
+    sent = run(s, 100.0)
+    assert 0.9 * budget * 100 <= sent <= budget * 100 + max(budget, 1)
+
+
+def test_partial_rounds_do_not_converge_before_every_request_was_seen():
+    s = scheduler(interval=3.0)
+    keys = list(s.interval)
+    stability = StabilityWindow(keys, window=30.0, now=0.0)
+    # only the requests of switch 1 answered, every 0.1s for far longer than the window
+    for tick in range(1, 1000):
+        stability.record([key for key in keys if key[0] == 1], 0, True, tick * 0.1)
+    assert not stability.converged(100.0)
+    stability.record([key for key in keys if key[0] != 1], 0, True, 100.0)
+    assert stability.converged(100.0)
+
+
+def test_changes_and_idle_flows_restart_the_window():
+    keys = list(scheduler().interval)
+    stability = StabilityWindow(keys, window=30.0, threshold=1, now=0.0)
+    stability.record(keys, 0, False, 10.0)
+    stability.record(keys, 0, True, 35.0)
+    assert not stability.converged(35.0)
+    stability.record(keys, 1, True, 40.0)
+    assert stability.converged(40.0)
+    stability.record(keys[:1], 2, True, 41.0)
+    stability.record(keys, 0, True, 70.0)
+    assert not stability.converged(70.0)
+    assert stability.converged(71.0)
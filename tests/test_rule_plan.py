@@ -0,0 +1,62 @@
+from itertools import islice
+
+import networkx as nx
+
+from controller.RulePlan import RulePlan
+from utils.FlowIndex import FlowIndex
+
+HOST_PORT = 1
+
+
+def topology() -> (nx.Graph, dict[(int, int), int], dict[(int, int), int]):
+    graph = nx.convert_node_labels_to_integers(nx.grid_2d_graph(4, 4), 1)
+    switch_switch_port = {}
+    for switch_id in graph:
+        for port, neighbor in enumerate(sorted(graph[switch_id]), HOST_PORT + 1):
+            switch_switch_port[(switch_id, neighbor)] = port
+    return graph, switch_switch_port, {(switch_id, switch_id): HOST_PORT for switch_id in graph}
+
+
+def conflicting_flows(graph: nx.Graph) -> dict[int, [int]]:
+    """
+    Three different paths between each of a few host pairs, so flows between the same hosts part ways on some switches.
+    """
+    flows = {}
+    for src, dst in [(1, 16), (4, 13), (2, 15), (16, 1)]:
+        for path in islice(nx.shortest_simple_paths(graph, src, dst), 3):
+            flows[len(flows) + 1] = path
+    return flows
+
+
+def walk(plan: RulePlan, switch_switch_port: dict[(int, int), int], flow_id: int, path: [int]) -> [int]:
+    """
+    Follows a packet of a flow through the flow tables the plan installs; later rules overwrite earlier ones with
+    the same priority and match, as a FlowMod does.
+    """
+    neighbor_at = {(switch_id, port): neighbor for (switch_id, neighbor), port in switch_switch_port.items()}
+    tables = {}
+    for switch_id in set(switch_id for _, neighbor in switch_switch_port for switch_id in [neighbor]):
+        for rule in plan.rules(switch_id):
+            tables[(switch_id, rule.priority, rule.ipv6_src, rule.ipv6_dst, rule.ipv6_flabel)] = rule.out_port
+    src, dst = plan.subnet(path[0]), plan.subnet(path[-1])
+    visited = [path[0]]
+    while len(visited) <= len(path):
+        switch_id = visited[-1]
+        port = tables.get((switch_id, 3, src, dst, flow_id), tables.get((switch_id, 2, src, dst, None)))
+        if port == HOST_PORT:
+            return visited
+        visited.append(neighbor_at[(switch_id, port)])
+    return visited
+
+
+def test_flows_between_the_same_hosts_keep_their_paths_when_only_polled_switches_count():
+    graph, switch_switch_port, switch_host_port = topology()
+    flows = conflicting_flows(graph)
+    plan = RulePlan(FlowIndex.from_flows(flows.items()), switch_switch_port, switch_host_port)
+    polling = {}
+    for flow_id, path in flows.items():
+        polling.setdefault(path[0], []).append(flow_id)
+    plan.set_polling(polling)
+    assert plan.num_rules() < 3 * sum(len(path) for path in flows.values())
+    for flow_id, path in flows.items():
+        assert walk(plan, switch_switch_port, flow_id, path) == path
@@ -0,0 +1,188 @@
+import random
+
+import networkx as nx
+import pytest
+
+from utils.FlowGenerator import generate_flow_index
+from utils.GraphGenerator import erdos_renyi_generator
+from utils.SetCover import SET_COVER_ENGINES, IncrementalSetCover, deduplicate_polling, partition_set_cover, \
+    polling_cost, set_cover_lower_bound, set_cover_solve, set_cover_solve_aggregated, set_cover_solve_anytime, \
+    set_cover_solve_capacitated, set_cover_solve_partitioned, set_cover_solve_sparse
+
+
+def instance(num_switches: int, num_flows: int, seed: int = 1) -> ([int], dict[int, [int]]):
+    """
+    Flows along shortest paths between random switches of a connected small-world graph.
+    """
+    graph = nx.connected_watts_strogatz_graph(num_switches, 4, 0.3, seed=seed)
+    rng = random.Random(seed)
+    s = {switch_id: [] for switch_id in graph}
+    for flow_id in range(1, num_flows + 1):
+        src, dst = rng.sample(sorted(graph), 2)
+        for switch_id in nx.shortest_path(graph, src, dst):
+            s[switch_id].append(flow_id)
+    return list(range(1, num_flows + 1)), s
+
+
+def assert_covers(polling: dict[int, [int]], f: [int], s: dict[int, [int]]) -> None:
+    assert {flow for flows in polling.values() for flow in flows} == set(f)
+    for switch_id, flows in polling.items():
+        assert set(flows) <= set(s[switch_id])
+
+
+# Two overlapping switches and a small one: every greedy step picks a whole switch, so no engine draws single flows.
+NESTED_F = list(range(1, 25))
+NESTED_S = {1: list(range(1, 11)), 2: list(range(8, 21)), 3: list(range(18, 25))}
+
+
+def test_engines_agree_when_every_pick_is_a_whole_switch():
+    polling = set_cover_solve(NESTED_F, NESTED_S)
+    assert polling == set_cover_solve_sparse(NESTED_F, NESTED_S)
+    assert list(polling) == [2, 1, 3]
+
+
+@pytest.mark.parametrize('engine', sorted(SET_COVER_ENGINES))
+def test_engines_cover_every_flow(engine):
+    f, s = instance(30, 300)
+    random.seed(1)
+    assert_covers(SET_COVER_ENGINES[engine](f, s), f, s)
+
+
+def test_deduplicate_keeps_every_flow_on_its_first_switch():
+    assert deduplicate_polling({1: [1, 2], 2: [2, 3], 3: [3], 4: [1]}) == {1: [1, 2], 2: [3]}
+
+
+def test_incremental_keeps_every_flow_polled_once():
+    f, s = instance(30, 300)
+    flows = {flow_id: [switch_id for switch_id, switch_flows in s.items() if flow_id in switch_flows] for flow_id in f}
+    cover = IncrementalSetCover(dict(list(flows.items())[:200]), max_drift=0.2)
+    for flow_id, path in list(flows.items())[200:]:
+        cover.add_flow(flow_id, path)
+    for flow_id in list(flows)[:100]:
+        cover.remove_flow(flow_id)
+        del flows[flow_id]
+    polling = cover.current_polling()
+    assert sorted(flow for polled in polling.values() for flow in polled) == sorted(flows)
+    for switch_id, polled in polling.items():
+        assert all(switch_id in flows[flow_id] for flow_id in polled)
+    assert cover.cost == polling_cost(polling)
+    with pytest.raises(KeyError):
+        cover.remove_flow(1)
+    with pytest.raises(ValueError):
+        cover.add_flow(list(flows)[0], [1])
+
+
+def test_anytime_improves_the_greedy_and_stays_above_the_bound():
+    f, s = instance(30, 300)
+    random.seed(1)
+    initial = set_cover_solve_sparse(f, s)
+    polling, cost, lower_bound = set_cover_solve_anytime(f, s, time_budget=0.5, initial=initial, seed=1)
+    assert_covers(polling, f, s)
+    assert sorted(flow for flows in polling.values() for flow in flows) == sorted(f)
+    assert cost == polling_cost(polling)
+    assert lower_bound <= cost <= polling_cost(initial)
+    assert set_cover_lower_bound(f, s) <= len(polling)
+
+
+def test_anytime_completes_an_initial_solution_that_misses_flows():
+    f, s = instance(30, 300)
+    initial = set_cover_solve_sparse(f[:100], {switch_id: [flow for flow in flows if flow in f[:100]]
+                                              for switch_id, flows in s.items()})
+    polling, cost, _ = set_cover_solve_anytime(f, s, time_budget=0.1, initial=initial, seed=1)
+    assert_covers(polling, f, s)
+    assert sorted(flow for flows in polling.values() for flow in flows) == sorted(f)
+    assert cost == polling_cost(polling)
+
+
+def test_aggregated_polls_every_flow_once():
+    f, s = instance(30, 300)
+    polling = set_cover_solve_aggregated(f, s)
+    assert_covers(polling, f, s)
+    assert sorted(flow for flows in polling.values() for flow in flows) == sorted(f)
+
+
+def test_aggregated_picks_the_switches_of_the_greedy_when_it_picks_whole_switches():
+    greedy = deduplicate_polling(set_cover_solve(NESTED_F, NESTED_S))
+    assert {switch_id: set(flows) for switch_id, flows in greedy.items()} == \
+           {switch_id: set(flows) for switch_id, flows in set_cover_solve_aggregated(NESTED_F, NESTED_S).items()}
+
+
+def test_partition_splits_flows_and_switches():
+    f, s = instance(200, 3000)
+    parts, cut_flows = partition_set_cover(f, s, max_flows_per_part=1000)
+    assert sorted(flow for part_flows, _ in parts for flow in part_flows) == sorted(f)
+    part_switches = [set(part_switch_flows) for _, part_switch_flows in parts]
+    assert sum(len(switches) for switches in part_switches) == len(set().union(*part_switches))
+    assert 0 <= cut_flows <= len(f)
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_partitioned_solution_covers_every_flow(max_workers):
+    f, s = instance(200, 3000)
+    polling = set_cover_solve_partitioned(f, s, 'sparse', max_workers, max_flows_per_part=1000)
+    assert_covers(polling, f, s)
+
+
+def test_capacitated_respects_the_capacity():
+    f, s = instance(30, 300)
+    polling = set_cover_solve_capacitated(f, s, capacity=40)
+    assert_covers(polling, f, s)
+    assert sorted(flow for flows in polling.values() for flow in flows) == sorted(f)
+    assert max(len(flows) for flows in polling.values()) <= 40
+    with pytest.raises(ValueError):
+        set_cover_solve_capacitated(f, s, capacity=0)
+
+
+def test_heapq_gives_the_same_plan_for_flow_index_views():
+    index = generate_flow_index(300, erdos_renyi_generator(20, 0.3, 1), seed=1)
+    f = list(index.flows.keys())
+    random.seed(1)
+    from_views = set_cover_solve(f, dict(index.switch_flows.items()))
+    random.seed(1)
+    from_lists = set_cover_solve(f, {switch_id: list(flows) for switch_id, flows in index.switch_flows.items()})
+    assert from_views == from_lists
+    assert all(type(flows) is list for flows in from_views.values())
+
+
+def generated_instance(graph: nx.Graph, num_flows: int, max_path_length: int = None) -> ([int], dict[int, [int]]):
+    index = generate_flow_index(num_flows, graph, seed=1, max_path_length=max_path_length)
+    return list(index.flows.keys()), {switch_id: list(flows) for switch_id, flows in index.switch_flows.items()}
+
+
+def test_partition_keeps_local_flows_in_one_region():
+    # clusters joined by single edges: regions grown by flow locality follow the clusters
+    f, s = generated_instance(nx.convert_node_labels_to_integers(nx.connected_caveman_graph(8, 25), 1), 20000, 4)
+    parts, cut_flows = partition_set_cover(f, s, max_flows_per_part=5000)
+    assert len(parts) == 4
+    assert cut_flows <= 0.1 * len(f)
+    assert sorted(flow for part_flows, _ in parts for flow in part_flows) == sorted(f)
+    for part_flows, part_switch_flows in parts:
+        assert_covers(part_switch_flows, part_flows, s)
+
+
+def test_partition_places_the_boundaries_to_fit_the_cut_budget():
+    # a boundary through a cluster cuts more than 1% of the flows, one between clusters does not
+    f, s = generated_instance(nx.convert_node_labels_to_integers(nx.connected_caveman_graph(8, 25), 1), 20000, 4)
+    parts, cut_flows = partition_set_cover(f, s, max_flows_per_part=10000, max_cut_fraction=0.01)
+    assert len(parts) == 2
+    assert cut_flows <= 0.01 * len(f)
+    for part_flows, part_switch_flows in parts:
+        assert_covers(part_switch_flows, part_flows, s)
+        assert len({(switch_id - 1) // 25 for switch_id in part_switch_flows}) == 4
+
+
+def test_partition_falls_back_to_one_part_when_the_cut_is_too_large():
+    # random flows on a random graph cross every region boundary
+    f, s = generated_instance(erdos_renyi_generator(100, 0.1, 1), 3000)
+    parts, cut_flows = partition_set_cover(f, s, max_flows_per_part=1000, max_cut_fraction=0.1)
+    assert len(parts) == 1
+    assert cut_flows == 0
+    assert sorted(parts[0][0]) == sorted(f)
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_partitioned_solution_is_close_to_global(max_workers):
+    f, s = generated_instance(nx.convert_node_labels_to_integers(nx.connected_caveman_graph(8, 25), 1), 20000, 4)
+    polling = set_cover_solve_partitioned(f, s, 'sparse', max_workers, max_flows_per_part=5000)
+    assert_covers(polling, f, s)
+    assert polling_cost(polling) <= 1.1 * polling_cost(set_cover_solve_sparse(f, s))
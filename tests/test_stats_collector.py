@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('ryu')
+
+from controller.StatsCollector import StatsCollector
+from utils.CookieAllocator import COOKIE_EXACT_MASK, CookieAllocator
+
+
+class Datapath:
+    """
+    Counts xids per switch like ryu's Datapath, here all from the same start so they collide across switches.
+    """
+
+    def __init__(self, datapath_id: int):
+        self.id = datapath_id
+        self.xid = 0
+        self.sent = []
+
+    def set_xid(self, msg) -> None:
+        self.xid += 1
+        msg.set_xid(self.xid)
+
+    def send_msg(self, msg) -> None:
+        self.sent.append(msg)
+
+
+def poll(collector: StatsCollector, datapaths: dict[int, Datapath], byte_counts: dict[int, dict[int, int]],
+         requests: dict[int, list[(int, int)]] = None):
+    """
+    Runs one round in which switch k reports byte_counts[k] for the flows it is asked about.
+    """
+    stats_round = collector.start_round(datapaths, requests)
+    for datapath in datapaths.values():
+        while datapath.sent:
+            msg = datapath.sent.pop(0)
+            body = [SimpleNamespace(cookie=flow_id, byte_count=byte_count)
+                    for flow_id, byte_count in byte_counts[datapath.id].items() if flow_id == msg.cookie]
+            collector.handle_reply(SimpleNamespace(datapath=datapath, xid=msg.xid, flags=0, body=body))
+    assert collector.round_complete()
+    return stats_round
+
+
+def test_replies_with_the_same_xid_from_different_switches():
+    collector = StatsCollector(CookieAllocator({1: [1, 2], 2: [3, 4]}))
+    stats_round = poll(collector, {1: Datapath(1), 2: Datapath(2)}, {1: {1: 10, 2: 20}, 2: {3: 30, 4: 40}})
+    assert len(stats_round.answered) == 4
+    assert stats_round.failed == 0
+    assert collector.flow_stats == {1: 10, 2: 20, 3: 30, 4: 40}
+
+
+def test_flow_polled_on_switches_with_different_counts_converges():
+    # flow 1 is polled on both switches, as the heapq engine does for every flow of a picked switch
+    collector = StatsCollector(CookieAllocator({1: [1, 2], 2: [1]}))
+    datapaths = {1: Datapath(1), 2: Datapath(2)}
+    # the link between the switches drops packets, so switch 2 counts fewer bytes of flow 1 for good
+    byte_counts = {1: {1: 1000, 2: 300}, 2: {1: 950}}
+    assert poll(collector, datapaths, byte_counts).changed == {1: 1000, 2: 300}
+    for _ in range(5):
+        assert poll(collector, datapaths, byte_counts).changed == {}
+    assert poll(collector, datapaths, byte_counts, {2: [(1, COOKIE_EXACT_MASK)]}).changed == {}
+    assert collector.flow_stats == {1: 1000, 2: 300}
+    assert collector.version == 1
+
+
+def test_growing_count_on_any_switch_is_a_change():
+    collector = StatsCollector(CookieAllocator({1: [1, 2], 2: [1]}))
+    datapaths = {1: Datapath(1), 2: Datapath(2)}
+    poll(collector, datapaths, {1: {1: 0, 2: 0}, 2: {1: 0}})
+    assert collector.active_flows == 0
+    stats_round = poll(collector, datapaths, {1: {1: 0, 2: 0}, 2: {1: 500}})
+    assert stats_round.changed == {1: 500}
+    assert [changed for _, changed in stats_round.answered] == [False, False, True]
+    assert collector.flow_stats == {1: 500, 2: 0}
+    assert collector.active_flows == 1
@@ -0,0 +1,19 @@
+from utils.StatsStore import StatsStore, latest_run, read_snapshot
+
+
+def test_every_run_writes_its_own_directory(tmp_path):
+    first = StatsStore(str(tmp_path))
+    first.append(1.0, {1: 100, 2: 200})
+    first.close()
+    second = StatsStore(str(tmp_path))
+    second.append(2.0, {1: 150})
+    second.close()
+    assert first.directory != second.directory
+    assert latest_run(str(tmp_path)) == second.directory
+    assert read_snapshot(first.directory) == {1: 100, 2: 200}
+    assert read_snapshot(second.directory) == {1: 150}
+
+
+def test_no_run_yet(tmp_path):
+    assert latest_run(str(tmp_path)) is None
+    assert latest_run(str(tmp_path / 'missing')) is None
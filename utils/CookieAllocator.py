@@ -0,0 +1,64 @@
+from utils.SetCover import deduplicate_polling
+
+COOKIE_EXACT_MASK = 0xFFFFFFFFFFFFFFFF
+# Aggregated cookies: | 1 tag bit | 31 bits polling group | 32 bits index in group |
+# The tag bit keeps them apart from flow ids and from the fixed cookies of forwarding/NDP/ARP rules.
+COOKIE_AGGREGATED_TAG = 1 << 63
+COOKIE_INDEX_BITS = 32
+COOKIE_GROUP_MASK = COOKIE_EXACT_MASK ^ ((1 << COOKIE_INDEX_BITS) - 1)
+MAX_COOKIE_GROUPS = 1 << 31
+
+
+class CookieAllocator:
+    """
+    Assigns the cookies of the per-flow counting rules and the stats requests that read them back.
+    In exact mode the cookie of a flow is its id and every flow is requested on its own.
+    In aggregated mode all flows polled on the same switch share a cookie prefix,
+    so a single request with COOKIE_GROUP_MASK retrieves all of them.
+    """
+
+    def __init__(self, polling: dict[int, [int]], aggregate: bool = False):
+        """
+        :param polling: switch id -> flows to poll, as returned by set cover
+        :param aggregate: allocate shared prefixes per polled switch
+        """
+        self.aggregate = aggregate
+        self.flow_cookie: dict[int, int] = {}  # flow id -> cookie
+        self.cookie_flow: dict[int, int] = {}  # cookie -> flow id
+        self.switch_requests: dict[int, [(int, int)]] = {}  # switch id -> list of (cookie, cookie mask) to request
+        if not aggregate:
+            for switch_id, flows in polling.items():
+                self.switch_requests[switch_id] = [(flow_id, COOKIE_EXACT_MASK) for flow_id in flows]
+            return
+        # a flow can only carry one cookie, so it must be polled on exactly one switch
+        polling = deduplicate_polling(polling)
+        if len(polling) > MAX_COOKIE_GROUPS:
+            raise ValueError(f'at most {MAX_COOKIE_GROUPS} polled switches are supported')
+        for group, (switch_id, flows) in enumerate(polling.items()):
+            if len(flows) >> COOKIE_INDEX_BITS:
+                raise ValueError(f'too many flows polled on switch {switch_id}')
+            prefix = COOKIE_AGGREGATED_TAG | (group << COOKIE_INDEX_BITS)
+            for index, flow_id in enumerate(flows):
+                self.flow_cookie[flow_id] = prefix | index
+                self.cookie_flow[prefix | index] = flow_id
+            self.switch_requests[switch_id] = [(prefix, COOKIE_GROUP_MASK)]
+
+    def cookie(self, flow_id: int) -> int:
+        """
+        :return: the cookie of the counting rule of a flow
+        """
+        return self.flow_cookie.get(flow_id, flow_id)
+
+    def flow_id(self, cookie: int) -> int:
+        """
+        :return: the flow id a counting rule cookie belongs to, None for cookies that are no counting rule
+        """
+        if self.aggregate:
+            return self.cookie_flow.get(cookie)
+        return cookie if not cookie & COOKIE_AGGREGATED_TAG else None
+
+    def requests(self, switch_id: int) -> [(int, int)]:
+        """
+        :return: list of (cookie, cookie mask) to request on a switch, empty if the switch is not polled
+        """
+        return self.switch_requests.get(switch_id, [])
@@ -0,0 +1,69 @@
+import struct
+from array import array
+from contextlib import nullcontext
+from typing import BinaryIO, Iterable, Iterator, Union
+
+# Binary flow file shared by the controller (writer) and Mininet (reader):
+# header: magic, version; then one record per flow: flow id (uint32), path length (uint32), switch ids (uint32 each)
+FLOW_FILE_MAGIC = b'FCFL'
+FLOW_FILE_VERSION = 1
+_HEADER = struct.Struct('<4sH')
+_RECORD = struct.Struct('<II')
+_CHUNK_BYTES = 1 << 20
+
+
+def write_flows(filename: str, flows: Iterable[tuple[int, list[int]]]) -> int:
+    """
+    Streams (flow id, path) pairs to a flow file without materializing them, e.g. straight from
+    utils.FlowGenerator.iter_random_flows or dict.items().
+    :return: number of flows written
+    """
+    count = 0
+    with open(filename, 'wb') as f:
+        f.write(_HEADER.pack(FLOW_FILE_MAGIC, FLOW_FILE_VERSION))
+        buf = array('I')
+        for flow_id, path in flows:
+            buf.append(flow_id)
+            buf.append(len(path))
+            buf.extend(int(switch_id) for switch_id in path)
+            count += 1
+            if len(buf) * buf.itemsize >= _CHUNK_BYTES:
+                f.write(buf.tobytes())
+                buf = array('I')
+        f.write(buf.tobytes())
+    return count
+
+
+def iter_flows(file: Union[str, BinaryIO]) -> Iterator[tuple[int, list[int]]]:
+    """
+    Lazily reads (flow id, path) pairs back from a flow file.
+    :param file: name of the flow file, or the flow file opened in binary mode
+    """
+    with open(file, 'rb') if isinstance(file, str) else nullcontext(file) as f:
+        magic, version = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != FLOW_FILE_MAGIC or version != FLOW_FILE_VERSION:
+            raise ValueError(f'{f.name} is not a version {FLOW_FILE_VERSION} flow file')
+        pending = b''
+        while True:
+            chunk = f.read(_CHUNK_BYTES)
+            if not chunk:
+                break
+            data = pending + chunk
+            buf = array('I', data[:len(data) // 4 * 4])
+            pending = data[len(data) // 4 * 4:]
+            i = 0
+            while i + 2 <= len(buf) and i + 2 + buf[i + 1] <= len(buf):
+                length = buf[i + 1]
+                yield buf[i], buf[i + 2:i + 2 + length].tolist()
+                i += 2 + length
+            pending = buf[i:].tobytes() + pending
+        if pending:
+            raise ValueError(f'{f.name} is truncated')
+
+
+def read_flows(file: Union[str, BinaryIO]) -> dict[int, [int]]:
+    """
+    :param file: name of the flow file, or the flow file opened in binary mode
+    :return: a dict: flow id -> list of switch ids
+    """
+    return dict(iter_flows(file))
@@ -1,71 +1,187 @@
 import networkx as nx
+import numpy as np
 from random import random, choice,shuffle,randint
 
 from networkx import connected_components
 
 from utils.GraphGenerator import *
+from utils.FlowIndex import FlowIndex
 from math import factorial
+from random import Random
+from typing import Iterator
 from pprint import pprint
 
 def permutation_number(n: int, k: int) -> int:
     return factorial(n) // factorial(n-k)
-def generate_random_flows(m: int, topology: nx.Graph) -> dict[int, list[int]]:
+
+def max_flows_at_least(m: int, topology: nx.Graph) -> bool:
+    """
+    Checks whether the topology can hold m distinct flows, using the same bound as before
+    (sum of n!/(n-k)! for k >= 2 over every connected component with n nodes).
+    The terms are built incrementally and the sum stops as soon as it reaches m, so no huge integers are built.
+    """
+    total = 0
+    for scc in connected_components(topology):
+        n = len(scc)
+        term = 1
+        for k in range(1, n + 1):
+            term *= n - k + 1  # n!/(n-k)!
+            if k >= 2:
+                total += term
+            if total >= m:
+                return True
+    return False
+
+def csr_adjacency(topology: nx.Graph) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Converts a topology into CSR arrays over node indices 0..n-1.
+    :return: (node ids as int, row pointer, column indices)
     """
-    Generate random flows in a topology. Ensures no flow is the same and uses backtracking when no unvisited neighbors are available.
+    nodes = list(topology.nodes())
+    node_ids = np.array([int(node) for node in nodes], dtype=np.int64)
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[a], index[b]) for a, b in topology.edges() if a != b], dtype=np.int64).reshape(-1, 2)
+    rows = np.concatenate([edges[:, 0], edges[:, 1]])
+    cols = np.concatenate([edges[:, 1], edges[:, 0]])
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(nodes)), out=indptr[1:])
+    return node_ids, indptr, cols[order]
+
+def sample_path_batch(indptr: np.ndarray, indices: np.ndarray, num_paths: int, max_path_length: int,
+                      rng: np.random.Generator, tries: int = 4) -> np.ndarray:
+    """
+    Samples num_paths random simple paths at once, like generate_path used to do one by one:
+    a uniform random start node, a uniform random length in 1..max_path_length, and at every step a uniform random
+    unvisited neighbour; a path ends early when there is none.
+    Neighbours are drawn by rejection against a per-path visited bitmap; paths that keep hitting visited
+    neighbours after a few tries fall back to an exact draw among their unvisited neighbours.
+    :return: array (num_paths, longest length) of node indices, padded with -1
+    """
+    n = len(indptr) - 1
+    degree = np.diff(indptr)
+    lengths = rng.integers(1, max_path_length + 1, num_paths)
+    width = int(lengths.max())
+    paths = np.full((num_paths, width), -1, dtype=np.int64)
+    visited = np.zeros((num_paths, n), dtype=bool)
+    rows = np.arange(num_paths)
+    paths[:, 0] = rng.integers(0, n, num_paths)
+    visited[rows, paths[:, 0]] = True
+    active = rows[lengths > 1]
+    for step in range(1, width):
+        current = paths[active, step - 1]
+        has_neighbors = degree[current] > 0
+        active, current = active[has_neighbors], current[has_neighbors]
+        if not active.size:
+            break
+        next_nodes = np.full(active.size, -1, dtype=np.int64)
+        pending = np.arange(active.size)
+        for _ in range(tries):
+            if not pending.size:
+                break
+            offsets = (rng.random(pending.size) * degree[current[pending]]).astype(np.int64)
+            candidates = indices[indptr[current[pending]] + offsets]
+            free = ~visited[active[pending], candidates]
+            next_nodes[pending[free]] = candidates[free]
+            pending = pending[~free]
+        if pending.size:
+            # exact draw among the unvisited neighbours, all pending paths at once over their flattened neighbour lists
+            counts = degree[current[pending]]
+            segment = np.repeat(np.arange(pending.size), counts)
+            position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            neighbors = indices[np.repeat(indptr[current[pending]], counts) + position]
+            free = ~visited[active[pending][segment], neighbors]
+            neighbors, segment = neighbors[free], segment[free]
+            free_counts = np.bincount(segment, minlength=pending.size)
+            has_free = free_counts > 0
+            first = np.cumsum(free_counts) - free_counts
+            pick = (rng.random(pending.size) * free_counts).astype(np.int64)
+            next_nodes[pending[has_free]] = neighbors[(first + pick)[has_free]]
+        moved = next_nodes >= 0
+        active, next_nodes = active[moved], next_nodes[moved]
+        paths[active, step] = next_nodes
+        visited[active, next_nodes] = True
+        active = active[lengths[active] > step + 1]
+    return paths
+
+def as_numpy_generator(seed) -> np.random.Generator:
+    """
+    Accepts None, an int seed, a random.Random or a NumPy Generator and returns a NumPy Generator.
+    A random.Random is consumed for a 128-bit seed, so it stays the single source of randomness of an experiment.
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    if isinstance(seed, Random):
+        return np.random.default_rng(seed.getrandbits(128))
+    return np.random.default_rng(seed)
+
+def iter_random_flows(m: int, topology: nx.Graph, seed=None, max_path_length: int = None,
+                      batch_size: int = None) -> Iterator[tuple[int, list[int]]]:
+    """
+    Lazily yields m random flows as (flow id, path) with flow ids counting up from 1. Ensures no flow is the same.
+    Paths are sampled in batches over a CSR adjacency (see sample_path_batch). Only a 64-bit hash of every path
+    is remembered for deduplication, so memory does not hold the paths a second time; a hash collision merely
+    makes the generator draw another path.
     :param m: Number of flows to generate.
     :param topology: Networkx graph representing the topology.
-    :return: Dictionary of flow IDs to path lists.
+    :param seed: None, int, random.Random or numpy.random.Generator driving the generation.
+    :param max_path_length: longest path in switches, defaults to the number of switches.
+    :param batch_size: paths sampled at once, defaults to what keeps the visited bitmap around 16 MB.
     """
-    flows = {}
+    if not max_flows_at_least(m, topology):
+        raise ValueError(f"Impossible to generate {m} flows for this graph. Either raise generation probability (by changing parameters) or retry.")
+    if m <= 0:
+        return
+    rng = as_numpy_generator(seed)
+    node_ids, indptr, indices = csr_adjacency(topology)
+    if max_path_length is None:
+        max_path_length = len(node_ids)
+    if batch_size is None:
+        batch_size = max(1, 2**24 // len(node_ids))
+    path_hashes = set()
     flow_id = 1
-    nodes = list(topology.nodes())
-    all_paths = set()
     attempt = 0
-
-    # Validate
-    max_flows = 0
-    all_scc = connected_components(topology)
-    for scc in all_scc:
-        num_nodes = len(scc)
-        max_flows += sum((permutation_number(num_nodes, k) for k in range(2, num_nodes+1)))
-    if m > max_flows:
-        raise ValueError(f"Impossible to generate {m} flows for this graph. Either raise generation probability (by changing parameters) or retry.")
-
-    def generate_path(start_node):
-        path = [int(start_node)]
-        visited = {start_node}
-        path_length = randint(1, len(nodes))
-        current_node = start_node
-
-        for _ in range(path_length - 1):
-            neighbors = [n for n in topology.neighbors(current_node) if n not in visited and topology.has_edge(current_node, n)]
-            if not neighbors:
-                break
-            next_node = choice(neighbors)
-            path.append(int(next_node))
-            visited.add(next_node)
-            current_node = next_node
-
-        return tuple(path)
-
     max_attempts = 100
-    while len(flows) < m and attempt < max_attempts:
-        start_node = choice(nodes)
-        path = generate_path(start_node)
-        if path not in all_paths and len(path) > 1:
-            all_paths.add(path)
-            flows[flow_id] = list(path)
-            print(f'Flow {flow_id} generated.')
+    while flow_id <= m and attempt < max_attempts:
+        paths = sample_path_batch(indptr, indices, min(batch_size, 2 * (m - flow_id + 1) + 16), max_path_length, rng)
+        path_lengths = (paths >= 0).sum(axis=1)
+        new_paths = 0
+        for path, length in zip(paths, path_lengths):
+            if length < 2:
+                continue
+            path = path[:length]
+            key = hash(path.tobytes())
+            if key in path_hashes:
+                continue
+            path_hashes.add(key)
+            yield flow_id, node_ids[path].tolist()
             flow_id += 1
-            attempt = 0
-        else:
-            print(f'duplicate path, attempt to generate path again, now it is {attempt}',)
-            attempt+=1
-
-
+            new_paths += 1
+            if flow_id > m:
+                break
+        # give up after max_attempts batches in a row without a single new path
+        attempt = 0 if new_paths else attempt + 1
 
+def generate_random_flows(m: int, topology: nx.Graph, seed=None, max_path_length: int = None,
+                          batch_size: int = None) -> dict[int, list[int]]:
+    """
+    Generate random flows in a topology. Ensures no flow is the same.
+    See iter_random_flows for the parameters.
+    :return: Dictionary of flow IDs to path lists.
+    """
+    flows = dict(iter_random_flows(m, topology, seed, max_path_length, batch_size))
+    print(f'{len(flows)} flows generated.')
     return flows
 
+def generate_flow_index(m: int, topology: nx.Graph, seed=None, max_path_length: int = None,
+                        batch_size: int = None) -> FlowIndex:
+    """
+    Same as generate_random_flows, but streams the flows straight into a FlowIndex instead of a dict.
+    """
+    index = FlowIndex.from_flows(iter_random_flows(m, topology, seed, max_path_length, batch_size))
+    print(f'{len(index)} flows generated, index uses {index.nbytes()} bytes.')
+    return index
+
 
 def generate_switch_flow_list(flows:dict[int, list[int]]) -> dict[int, [int]]:
         """
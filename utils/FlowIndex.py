@@ -0,0 +1,170 @@
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from typing import Iterable, Iterator
+
+import numpy as np
+
+
+class FlowIndex:
+    """
+    Compact inverted index between flows and switches, shared by the flow generator, set cover and the controller.
+    Both directions are stored CSR-style in flat arrays:
+        flow_ids[r]                                  id of the r-th flow, ascending
+        flow_switches[flow_ptr[r]:flow_ptr[r + 1]]   path of the r-th flow (switch ids)
+        switch_ids[r]                                id of the r-th switch, ascending
+        switch_flow_ids[switch_ptr[r]:switch_ptr[r + 1]]  ids of the flows passing through the r-th switch
+    Paths and flow lists are handed out as zero-copy memoryviews; flows and switch_flows wrap the index in
+    read-only Mapping views so it can stand in for the dict[int, [int]] used elsewhere.
+    With 4-byte ids and 8-byte offsets a flow costs 12 bytes plus 8 bytes per switch on its path.
+    """
+    __slots__ = ('flow_ids', 'flow_ptr', 'flow_switches', 'switch_ids', 'switch_ptr', 'switch_flow_ids',
+                 '_dense_flow_ids', '_switch_row', 'flows', 'switch_flows')
+
+    def __init__(self, flow_ids: array, flow_ptr: array, flow_switches: array):
+        """
+        Builds the switch -> flows direction from the flow -> switches arrays; use from_flows in most cases.
+        """
+        ids = np.frombuffer(flow_ids, dtype=np.uint32) if flow_ids else np.zeros(0, dtype=np.uint32)
+        if np.any(ids[1:] <= ids[:-1]):
+            raise ValueError('flow ids must be unique and ascending')
+        self.flow_ids = flow_ids
+        self.flow_ptr = flow_ptr
+        self.flow_switches = flow_switches
+        self._dense_flow_ids = not flow_ids or flow_ids[-1] - flow_ids[0] + 1 == len(flow_ids)
+
+        # transpose with a stable sort on the switch id of every (flow, switch) entry
+        switches = np.frombuffer(flow_switches, dtype=np.uint32) if flow_switches else np.zeros(0, dtype=np.uint32)
+        counts = np.diff(np.frombuffer(flow_ptr, dtype=np.uint64)).astype(np.int64)
+        owners = np.repeat(ids, counts)
+        order = np.argsort(switches, kind='stable')
+        unique_switches, switch_counts = np.unique(switches, return_counts=True)
+        switch_ptr = np.zeros(len(unique_switches) + 1, dtype=np.uint64)
+        np.cumsum(switch_counts, out=switch_ptr[1:])
+        self.switch_ids = array('I', unique_switches.astype(np.uint32).tobytes())
+        self.switch_ptr = array('Q', switch_ptr.tobytes())
+        self.switch_flow_ids = array('I', owners[order].astype(np.uint32).tobytes())
+        self._switch_row = {switch_id: row for row, switch_id in enumerate(self.switch_ids)}
+        self.flows = FlowPathView(self)
+        self.switch_flows = SwitchFlowView(self)
+
+    @classmethod
+    def from_flows(cls, flows: Iterable[tuple[int, Iterable[int]]]) -> 'FlowIndex':
+        """
+        Builds an index from (flow id, path) pairs, e.g. dict.items() or utils.FlowGenerator.iter_random_flows,
+        without keeping the pairs around.
+        """
+        flow_ids = array('I')
+        flow_ptr = array('Q', [0])
+        flow_switches = array('I')
+        ascending = True
+        for flow_id, path in flows:
+            flow_ids.append(flow_id)
+            flow_switches.extend(int(switch_id) for switch_id in path)
+            flow_ptr.append(len(flow_switches))
+            if len(flow_ids) > 1 and flow_ids[-2] > flow_id:
+                ascending = False
+        if not ascending:
+            # ids came unsorted: reorder all rows by flow id
+            order = sorted(range(len(flow_ids)), key=flow_ids.__getitem__)
+            sorted_ids = array('I')
+            sorted_ptr = array('Q', [0])
+            sorted_switches = array('I')
+            for row in order:
+                sorted_ids.append(flow_ids[row])
+                sorted_switches.extend(flow_switches[flow_ptr[row]:flow_ptr[row + 1]])
+                sorted_ptr.append(len(sorted_switches))
+            flow_ids, flow_ptr, flow_switches = sorted_ids, sorted_ptr, sorted_switches
+        return cls(flow_ids, flow_ptr, flow_switches)
+
+    def flow_row(self, flow_id: int) -> int:
+        """
+        :return: position of a flow in flow_ids; raises KeyError if it is not indexed
+        """
+        if self._dense_flow_ids:
+            row = flow_id - self.flow_ids[0] if self.flow_ids else -1
+            if 0 <= row < len(self.flow_ids):
+                return row
+        else:
+            row = bisect_left(self.flow_ids, flow_id)
+            if row < len(self.flow_ids) and self.flow_ids[row] == flow_id:
+                return row
+        raise KeyError(flow_id)
+
+    def path(self, flow_id: int) -> memoryview:
+        """
+        :return: zero-copy view of the switch ids on the path of a flow
+        """
+        row = self.flow_row(flow_id)
+        return memoryview(self.flow_switches)[self.flow_ptr[row]:self.flow_ptr[row + 1]]
+
+    def flows_of(self, switch_id: int) -> memoryview:
+        """
+        :return: zero-copy view of the ids of the flows passing through a switch
+        """
+        row = self._switch_row[switch_id]
+        return memoryview(self.switch_flow_ids)[self.switch_ptr[row]:self.switch_ptr[row + 1]]
+
+    def nbytes(self) -> int:
+        """
+        :return: bytes held by the index arrays
+        """
+        return sum(a.itemsize * len(a) for a in (self.flow_ids, self.flow_ptr, self.flow_switches,
+                                                  self.switch_ids, self.switch_ptr, self.switch_flow_ids))
+
+    def __len__(self) -> int:
+        return len(self.flow_ids)
+
+
+class FlowPathView(Mapping):
+    """
+    Read-only flow id -> path view over a FlowIndex.
+    """
+    __slots__ = ('index',)
+
+    def __init__(self, index: FlowIndex):
+        self.index = index
+
+    def __getitem__(self, flow_id: int) -> memoryview:
+        return self.index.path(flow_id)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.index.flow_ids)
+
+    def __len__(self) -> int:
+        return len(self.index.flow_ids)
+
+    def __contains__(self, flow_id) -> bool:
+        try:
+            self.index.flow_row(flow_id)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __repr__(self) -> str:
+        return f'<FlowPathView of {len(self)} flows>'
+
+
+class SwitchFlowView(Mapping):
+    """
+    Read-only switch id -> flow ids view over a FlowIndex.
+    """
+    __slots__ = ('index',)
+
+    def __init__(self, index: FlowIndex):
+        self.index = index
+
+    def __getitem__(self, switch_id: int) -> memoryview:
+        return self.index.flows_of(switch_id)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.index.switch_ids)
+
+    def __len__(self) -> int:
+        return len(self.index.switch_ids)
+
+    def __contains__(self, switch_id) -> bool:
+        return switch_id in self.index._switch_row
+
+    def __repr__(self) -> str:
+        return f'<SwitchFlowView of {len(self)} switches>'
@@ -1,17 +1,34 @@
+import numpy as np
 from networkx import Graph
-from itertools import product
-from random import random, choice
-from math import sqrt, ceil, exp
-def erdos_renyi_generator(n: int, p: float) -> Graph:
+from itertools import combinations
+from random import Random
+from math import sqrt, ceil, log
+def erdos_renyi_generator(n: int, p: float, seed: int = None) -> Graph:
+    """
+    G(n, p) in O(n + m) with the geometric skipping of Batagelj and Brandes:
+    instead of a coin flip per pair, draw how many pairs to skip until the next edge.
+    Nodes are 1..n.
+    """
+    rng = Random(seed)
     g = Graph()
     g.add_nodes_from(range(1, n+1))
-    for s1, s2 in product(range(1, n + 1), range(1, n + 1)):
-        if s1 >= s2:
-            continue
-        print(f'Evaluating edge {s1},{s2}')
-        x = random()
-        if x <= p:
-            g.add_edge(s1, s2)
+    if p <= 0:
+        return g
+    if p >= 1:
+        g.add_edges_from(combinations(range(1, n + 1), 2))
+        return g
+    log_q = log(1 - p)
+    edges = []
+    # walk the lower triangle row by row: pair (v, w) with w < v, 0-based
+    v, w = 1, -1
+    while v < n:
+        w += 1 + int(log(1 - rng.random()) / log_q)
+        while w >= v and v < n:
+            w -= v
+            v += 1
+        if v < n:
+            edges.append((w + 1, v + 1))
+    g.add_edges_from(edges)
     return g
 
 def linear_generator(n: int) -> Graph:
@@ -21,45 +38,92 @@ def linear_generator(n: int) -> Graph:
         g.add_edge(i, i+1)
     return g
 
-def waxman_generator_1(n: int, alpha: float, beta: float) -> Graph:
+def _upper_triangle_blocks(n: int, max_elements: int):
+    """
+    Splits the rows of an n x n matrix into blocks; block rows [i0, i1) are paired with columns [i0, n),
+    which covers the upper triangle while every block holds at most about max_elements entries.
+    """
+    i0 = 0
+    while i0 < n:
+        rows = max(1, max_elements // (n - i0))
+        yield i0, min(n, i0 + rows)
+        i0 += rows
+
+def _waxman_edges(g: Graph, n: int, pair_probability, max_elements: int) -> None:
+    """
+    Adds the edges i < j of a Waxman-style graph block by block. pair_probability(i0, i1) returns the edge
+    probabilities of rows [i0, i1) against columns [i0, n); the Bernoulli mask is drawn for the whole block at once.
+    """
+    for i0, i1 in _upper_triangle_blocks(n, max_elements):
+        p, draws = pair_probability(i0, i1)
+        mask = draws <= p
+        # keep the strict upper triangle: column index (offset by i0) must exceed the row index
+        mask &= np.arange(i0, n)[None, :] > np.arange(i0, i1)[:, None]
+        rows, cols = np.nonzero(mask)
+        g.add_edges_from(zip((rows + i0 + 1).tolist(), (cols + i0 + 1).tolist()))
+
+def _diameter(coords: np.ndarray) -> float:
+    """
+    Largest distance between two of the given 2D points. The farthest pair always lies on the convex hull,
+    so only hull points (Andrew's monotone chain) are compared pairwise.
+    """
+    points = sorted(set(map(tuple, coords.tolist())))
+    if len(points) < 2:
+        return 0.0
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower, upper = [], []
+    for point in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    for point in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+    hull = np.array(lower[:-1] + upper[:-1], dtype=np.float64)
+    diff = hull[:, None, :] - hull[None, :, :]
+    return float(np.sqrt((diff ** 2).sum(axis=-1).max()))
+
+def waxman_generator_1(n: int, alpha: float, beta: float, seed: int = None, max_elements: int = 1 << 20) -> Graph:
+    """
+    Waxman graph on a sqrt(n) x sqrt(n) grid: edge probability beta * exp(-d / (L * alpha)),
+    L being the largest distance between two nodes (see _diameter). Distances are computed with NumPy broadcasting over
+    blocks of the upper triangle holding at most max_elements pairs, so memory stays bounded for large n.
+    Nodes are 1..n.
+    """
+    rng = np.random.default_rng(seed)
     g = Graph()
     g.add_nodes_from(range(1, n + 1))
     side_length = ceil(sqrt(n))
-    all_possible_coords = list(product(range(1, side_length+1), range(1, side_length+1)))
-    coords: dict[int, (int, int)] = {}
-    for i in range(1, n+1):
-        x, y = choice(all_possible_coords)
-        coords[i] = (x, y)
-    dist: dict[(int, int), float] = {}
-    for i, j in product(coords.keys(), coords.keys()):
-        i_coords = coords[i]
-        j_coords = coords[j]
-        dist_i_j = sqrt((i_coords[0] - j_coords[0])**2 + (i_coords[1] - j_coords[1])**2)
-        dist[(i, j)] = dist_i_j
-    L = max(dist.values())
-    for i, j in product(range(1, n + 1), range(1, n + 1)):
-        if i >= j:
-            continue
-        p = beta * exp(-dist[(i, j)] / (L * alpha))
-        x = random()
-        if x <= p:
-            g.add_edge(i, j)
+    coords = rng.integers(1, side_length + 1, size=(n, 2)).astype(np.float64)
+
+    L = _diameter(coords)
+
+    def pair_probability(i0, i1):
+        dx = coords[i0:i1, None, 0] - coords[None, i0:, 0]
+        dy = coords[i0:i1, None, 1] - coords[None, i0:, 1]
+        d = np.sqrt(dx * dx + dy * dy)
+        return beta * np.exp(-d / (L * alpha)), rng.random(d.shape)
+
+    _waxman_edges(g, n, pair_probability, max_elements)
     return g
 
-def waxman_generator_2(n: int, alpha: float, beta: float, L: float) -> Graph:
+def waxman_generator_2(n: int, alpha: float, beta: float, L: float, seed: int = None, max_elements: int = 1 << 20) -> Graph:
+    """
+    Waxman graph with uniformly random distances in [0, L) between every pair of nodes.
+    Nodes are 1..n.
+    """
+    rng = np.random.default_rng(seed)
     g = Graph()
     g.add_nodes_from(range(1, n + 1))
-    dist: dict[(int, int), float] = {}
-    for i, j in product(range(1, n+1), range(1, n+1)):
-        if i == j:
-            dist[(i, j)] = 0
-        else:
-            dist[(i, j)] = random() * L
-    for i, j in product(range(1, n + 1), range(1, n + 1)):
-        if i >= j:
-            continue
-        p = beta * exp(-dist[(i, j)] / (L * alpha))
-        x = random()
-        if x <= p:
-            g.add_edge(i, j)
-    return g
\ No newline at end of file
+
+    def pair_probability(i0, i1):
+        shape = (i1 - i0, n - i0)
+        d = rng.random(shape) * L
+        return beta * np.exp(-d / (L * alpha)), rng.random(shape)
+
+    _waxman_edges(g, n, pair_probability, max_elements)
+    return g
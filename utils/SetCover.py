@@ -1,9 +1,22 @@
 import heapq
 import random
 import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from array import array
+from math import ceil
+from timeit import default_timer as timer
+
+# Bump whenever a solver changes its output; invalidates utils.SetCoverCache entries.
+SET_COVER_VERSION = 3
+
 def weight(s: [int]) -> int:
     return 122 + 78 * (len(s))
 
+def weight_aggregated(s: [int]) -> int:
+    # one cookie-masked request per switch, answered by a single reply with one 96-byte stats entry per flow
+    return 122 + 78 + 96 * (len(s))
+
 def set_cover_solve(f: [int], s: dict[int, [int]]) -> dict[int, [int]]:
     uncovered_flows = set(f)
     picked_switch = {}
@@ -76,9 +89,10 @@ def set_cover_solve(f: [int], s: dict[int, [int]]) -> dict[int, [int]]:
         current_ratio, switch_id, flows = pop_switch()
         newly_covered_flows = set(flows).intersection(uncovered_flows)
         if newly_covered_flows:
-            picked_switch[switch_id] = flows
+            # flows may be a view into a FlowIndex; the plan must own its lists
+            picked_switch[switch_id] = list(flows)
             uncovered_flows.difference_update(newly_covered_flows)
-            print(f"Picked switch {switch_id} covering flows {flows} with ratio {current_ratio}.")
+            print(f"Picked switch {switch_id} covering flows {picked_switch[switch_id]} with ratio {current_ratio}.")
 
             # Update priorities for all affected switches
             for flow in newly_covered_flows:
@@ -95,6 +109,717 @@ def set_cover_solve(f: [int], s: dict[int, [int]]) -> dict[int, [int]]:
     return picked_switch
 
 
+def _build_incidence(f: [int], s: dict[int, [int]]):
+    """
+    Builds the switch x flow incidence matrix in CSR form together with its transpose.
+    Flows are renumbered densely in the order of f; flows on a switch that are not in f are ignored.
+    :return: (switch_ids, switch_ptr, switch_idx, flow_ptr, flow_idx)
+    """
+    flow_index = {flow: i for i, flow in enumerate(f)}
+    switch_ids = list(s.keys())
+    switch_ptr = array('q', [0])
+    switch_idx = array('q')
+    flow_ptr = array('q', bytes(8 * (len(f) + 1)))
+    for flows in s.values():
+        for flow in flows:
+            i = flow_index.get(flow)
+            if i is not None:
+                switch_idx.append(i)
+                flow_ptr[i + 1] += 1
+        switch_ptr.append(len(switch_idx))
+    # transpose with a counting sort: flow_ptr becomes the row pointer of flow -> switches
+    for i in range(len(f)):
+        flow_ptr[i + 1] += flow_ptr[i]
+    flow_idx = array('q', bytes(8 * len(switch_idx)))
+    fill = array('q', flow_ptr[:-1])
+    for j in range(len(switch_ids)):
+        for k in range(switch_ptr[j], switch_ptr[j + 1]):
+            i = switch_idx[k]
+            flow_idx[fill[i]] = j
+            fill[i] += 1
+    return switch_ids, switch_ptr, switch_idx, flow_ptr, flow_idx
+
+
+def set_cover_solve_sparse(f: [int], s: dict[int, [int]]) -> dict[int, [int]]:
+    """
+    Same greedy as set_cover_solve, but on a CSR incidence matrix.
+    Every switch keeps a counter of its uncovered flows which is decremented when a flow gets covered;
+    heap entries are only re-evaluated lazily when they reach the top (ratios can only grow).
+    :param f: flow ids to cover
+    :param s: switch id -> flow ids on the switch
+    :return: a dict: switch id -> flows to poll
+    """
+    switch_ids, switch_ptr, switch_idx, flow_ptr, flow_idx = _build_incidence(f, s)
+    num_flows = len(f)
+    weight_of_switch = [weight(s[switch_id]) for switch_id in switch_ids]
+    uncovered_count = array('q', (switch_ptr[j + 1] - switch_ptr[j] for j in range(len(switch_ids))))
+    single_flow_ratio = weight([0]) / 1
+    picked_switch = {}
+
+    # uncovered flows, kept as a swap-remove list to pick random ones in O(1)
+    covered = bytearray(num_flows)
+    uncovered = array('q', range(num_flows))
+    position = array('q', range(num_flows))
+    remaining = num_flows
+
+    def cover(i):
+        nonlocal remaining
+        covered[i] = 1
+        remaining -= 1
+        last = uncovered[remaining]
+        uncovered[position[i]] = last
+        position[last] = position[i]
+        for k in range(flow_ptr[i], flow_ptr[i + 1]):
+            uncovered_count[flow_idx[k]] -= 1
+
+    pq = [(weight_of_switch[j] / uncovered_count[j], j) for j in range(len(switch_ids)) if uncovered_count[j]]
+    heapq.heapify(pq)
+
+    while remaining:
+        if not pq:
+            print("Priority queue is empty, no more switches to pick.")
+            break
+        ratio, j = pq[0]
+        count = uncovered_count[j]
+        if count == 0:
+            heapq.heappop(pq)
+            continue
+        current_ratio = weight_of_switch[j] / count
+        if current_ratio != ratio:
+            # stale entry: push it back with its real ratio
+            heapq.heapreplace(pq, (current_ratio, j))
+            continue
+
+        if ratio > single_flow_ratio:
+            # Randomly pick a flow and cover it
+            i = uncovered[random.randrange(remaining)]
+            chosen_switch = switch_ids[flow_idx[random.randrange(flow_ptr[i], flow_ptr[i + 1])]]
+            picked_switch.setdefault(chosen_switch, []).append(f[i])
+            cover(i)
+            continue
+
+        heapq.heappop(pq)
+        switch_id = switch_ids[j]
+        picked_switch[switch_id] = list(s[switch_id])
+        for k in range(switch_ptr[j], switch_ptr[j + 1]):
+            i = switch_idx[k]
+            if not covered[i]:
+                cover(i)
+
+    if remaining:
+        print("Not all flows could be covered with the available switches.")
+    else:
+        print("All flows have been successfully covered.")
+
+    return picked_switch
+
+
+def _growth_order(switch_flows: dict[int, [int]], flow_to_switch_ids: dict[int, [int]]) -> [int]:
+    """
+    Greedy graph growing: starting at the first switch, keeps taking the switch that shares the most flows with the
+    switches taken so far. Any prefix of this order is a region that keeps flows local, while a cut along a BFS order
+    slices through nearly every path.
+    :return: the switch ids in the order they were taken
+    """
+    order = []
+    taken = set()
+    shared = {}  # switch not taken yet -> flows it shares with the taken ones
+    touched = set()  # flows with a taken switch
+    pq = []
+    seeds = iter(switch_flows)
+    while len(order) < len(switch_flows):
+        while pq and (pq[0][2] in taken or -pq[0][0] != shared[pq[0][2]]):
+            heapq.heappop(pq)
+        if pq:
+            switch_id = heapq.heappop(pq)[2]
+        else:
+            # not connected to the switches taken so far, or the first switch: start from the next one not taken
+            switch_id = next(switch_id for switch_id in seeds if switch_id not in taken)
+        taken.add(switch_id)
+        order.append(switch_id)
+        for flow in switch_flows[switch_id]:
+            if flow in touched:
+                continue
+            touched.add(flow)
+            for other in flow_to_switch_ids[flow]:
+                if other not in taken:
+                    shared[other] = shared.get(other, 0) + 1
+                    heapq.heappush(pq, (-shared[other], len(pq), other))
+    return order
+
+
+def _bisect(switch_flows: dict[int, [int]], share: float, max_cut: int, cut: set) \
+        -> (dict[int, [int]], dict[int, [int]]):
+    """
+    Splits a region in two along its growth order. Every boundary position is scored while sweeping the order, and the
+    one whose first side carries closest to share of the flow entries wins among those cutting at most max_cut flows
+    not in cut yet. A side left with less than half of its share is not worth a subproblem, so such boundaries are not
+    considered. A flow crossing the boundary stays on the side holding most of its switches and loses the others.
+    :param cut: flows cut so far, updated with the flows this split cuts
+    :return: (first side, second side) as dicts switch id -> flows, or None when no boundary fits
+    """
+    flow_to_switch_ids = {}
+    for switch_id, flows in switch_flows.items():
+        for flow in flows:
+            flow_to_switch_ids.setdefault(flow, []).append(switch_id)
+    order = _growth_order(switch_flows, flow_to_switch_ids)
+    total = sum(len(flows) for flows in switch_flows.values())
+    target = share * total
+    taken = {}  # flow -> switches on the first side
+    num_cut = 0  # flows crossing the boundary and not cut before
+    load = 0
+    best = None  # (distance to target, boundary position)
+    for position, switch_id in enumerate(order[:-1], 1):
+        load += len(switch_flows[switch_id])
+        for flow in switch_flows[switch_id]:
+            taken[flow] = taken.get(flow, 0) + 1
+            if flow in cut:
+                continue
+            if taken[flow] == 1:
+                num_cut += 1
+            if taken[flow] == len(flow_to_switch_ids[flow]):
+                num_cut -= 1
+        if num_cut <= max_cut and target / 2 <= load and total - load >= (total - target) / 2 and \
+                (best is None or abs(load - target) < best[0]):
+            best = (abs(load - target), position)
+    if best is None:
+        return None
+    first = set(order[:best[1]])
+    sides = ({}, {})
+    for flow, switch_ids in flow_to_switch_ids.items():
+        on_first = sum(1 for switch_id in switch_ids if switch_id in first)
+        if 0 < on_first < len(switch_ids):
+            cut.add(flow)
+        keep_first = 2 * on_first >= len(switch_ids)
+        for switch_id in switch_ids:
+            if (switch_id in first) == keep_first:
+                sides[not keep_first].setdefault(switch_id, []).append(flow)
+    # keep the growth order, the next split grows from the same end
+    return tuple({switch_id: side[switch_id] for switch_id in order if switch_id in side} for side in sides)
+
+
+def partition_set_cover(f: [int], s: dict[int, [int]], max_flows_per_part: int = 50000,
+                        max_cut_fraction: float = 0.1) -> ([([int], dict[int, [int]])], int):
+    """
+    Splits a set cover instance into independent subproblems.
+    Connected components of the switch-flow bipartite graph never share a flow, so they are solved separately;
+    small components are batched together. A component with more than max_flows_per_part flows is split in halves
+    recursively, each boundary placed along an order of switches grown by flow locality; each flow is then only
+    allowed on the switches of the region holding most of its path. Only the flows that lost switches this way can
+    cost more than in a global solve, so the boundaries are chosen to cut at most max_cut_fraction of the component's
+    flows in total, and a region no boundary fits into stays whole.
+    On clustered topologies the boundaries fall between the clusters. On Erdos-Renyi and Waxman graphs random flows
+    have no locality: a single switch already carries more than a tenth of the flows, so no boundary fits the default
+    budget and the component is solved as one part. Searching for the boundary costs more than the solve there, so
+    partitioning is slower than the plain engine on those graphs (see utils.SetCoverBenchmark --topology).
+    :return: (list of (flows, switch id -> flows) subproblems, number of flows cut by a region boundary)
+    """
+    flow_to_switch_ids = {flow: [] for flow in f}
+    for switch_id, flows in s.items():
+        for flow in flows:
+            if flow in flow_to_switch_ids:
+                flow_to_switch_ids[flow].append(switch_id)
+
+    # BFS over the bipartite graph; components come out with their switches in BFS order
+    components = []
+    seen_switches = set()
+    seen_flows = set()
+    for start in s:
+        if start in seen_switches:
+            continue
+        seen_switches.add(start)
+        queue = deque([start])
+        component_switches = []
+        component_flows = []
+        while queue:
+            switch_id = queue.popleft()
+            component_switches.append(switch_id)
+            for flow in s[switch_id]:
+                if flow not in flow_to_switch_ids or flow in seen_flows:
+                    continue
+                seen_flows.add(flow)
+                component_flows.append(flow)
+                for other in flow_to_switch_ids[flow]:
+                    if other not in seen_switches:
+                        seen_switches.add(other)
+                        queue.append(other)
+        if component_flows:
+            components.append((component_switches, component_flows))
+
+    def whole(component_switches):
+        return {switch_id: [flow for flow in s[switch_id] if flow in flow_to_switch_ids]
+                for switch_id in component_switches}
+
+    parts = []
+    cut_flows = 0
+    batch_flows = []
+    batch_switch_flows = {}
+    for component_switches, component_flows in components:
+        if len(component_flows) <= max_flows_per_part:
+            batch_flows.extend(component_flows)
+            batch_switch_flows.update(whole(component_switches))
+            if len(batch_flows) >= max_flows_per_part:
+                parts.append((batch_flows, batch_switch_flows))
+                batch_flows = []
+                batch_switch_flows = {}
+            continue
+        # giant component: split it in halves until every region holds about max_flows_per_part flows
+        budget = int(max_cut_fraction * len(component_flows))
+        component_cut = set()
+        regions = []
+        pending = [(whole(component_switches), ceil(len(component_flows) / max_flows_per_part))]
+        while pending:
+            region, num_regions = pending.pop()
+            sides = None
+            if num_regions > 1:
+                sides = _bisect(region, (num_regions // 2) / num_regions, budget - len(component_cut), component_cut)
+            if sides is None:
+                regions.append(region)
+                continue
+            pending.append((sides[1], num_regions - num_regions // 2))
+            pending.append((sides[0], num_regions // 2))
+        if len(regions) == 1:
+            print(f'No region boundary in a component of {len(component_flows)} flows cuts at most '
+                  f'{max_cut_fraction:.0%} of them; solving it as one part.')
+        cut_flows += len(component_cut)
+        for region in regions:
+            parts.append((list(dict.fromkeys(flow for flows in region.values() for flow in flows)), region))
+    if batch_flows:
+        parts.append((batch_flows, batch_switch_flows))
+    return parts, cut_flows
+
+
+def _solve_part(engine: str, f: [int], s: dict[int, [int]]) -> dict[int, [int]]:
+    return SET_COVER_ENGINES[engine](f, s)
+
+
+def set_cover_solve_partitioned(f: [int], s: dict[int, [int]], engine: str = 'sparse', max_workers: int = None,
+                                max_flows_per_part: int = 50000, max_cut_fraction: float = 0.1) -> dict[int, [int]]:
+    """
+    Solves the independent subproblems from partition_set_cover on a process pool and merges the results.
+    Subproblems never share a switch, so merging is a plain dict union.
+    :param engine: key of SET_COVER_ENGINES used for every subproblem
+    :param max_workers: number of worker processes, defaults to the number of cores
+    :param max_cut_fraction: share of a component's flows a region cut may hit, see partition_set_cover
+    :return: a dict: switch id -> flows to poll
+    """
+    parts, cut_flows = partition_set_cover(f, s, max_flows_per_part, max_cut_fraction)
+    print(f'Set cover split into {len(parts)} subproblems, {cut_flows} of {len(f)} flows '
+          f'({cut_flows / max(len(f), 1):.1%}) cut by region boundaries.')
+    polling = {}
+    if len(parts) <= 1 or max_workers == 1:
+        for part_flows, part_switch_flows in parts:
+            polling.update(_solve_part(engine, part_flows, part_switch_flows))
+        return polling
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for result in executor.map(_solve_part, [engine] * len(parts), *zip(*parts)):
+            polling.update(result)
+    return polling
+
+
+def polling_cost(polling: dict[int, [int]], weight_fn=weight) -> int:
+    """
+    Bytes exchanged per polling round for a polling plan, using the given weight model.
+    """
+    return sum(weight_fn(flows) for flows in polling.values())
+
+
+def deduplicate_polling(polling: dict[int, [int]]) -> dict[int, [int]]:
+    """
+    The greedy polls every flow of a picked switch, so a flow may be listed by several switches.
+    Keeps every flow only on the first switch that lists it and drops switches left with nothing to poll.
+    """
+    seen = set()
+    result = {}
+    for switch_id, flows in polling.items():
+        unique_flows = [flow for flow in flows if flow not in seen]
+        seen.update(unique_flows)
+        if unique_flows:
+            result[switch_id] = unique_flows
+    return result
+
+
+def set_cover_solve_aggregated(f: [int], s: dict[int, [int]]) -> dict[int, [int]]:
+    """
+    Greedy for cookie-masked polling (see utils.CookieAllocator).
+    A masked request returns exactly the flows whose cookies carry the switch's prefix, so a picked switch only
+    costs weight_aggregated() of the flows it newly covers instead of weight() of all flows passing through it.
+    :param f: flow ids to cover
+    :param s: switch id -> flow ids on the switch
+    :return: a dict: switch id -> flows to poll, every flow listed exactly once
+    """
+    switch_ids, switch_ptr, switch_idx, flow_ptr, flow_idx = _build_incidence(f, s)
+    uncovered_count = array('q', (switch_ptr[j + 1] - switch_ptr[j] for j in range(len(switch_ids))))
+    covered = bytearray(len(f))
+    picked_switch = {}
+
+    def ratio(count):
+        return (weight_aggregated([]) + (weight_aggregated([0]) - weight_aggregated([])) * count) / count
+
+    pq = [(ratio(uncovered_count[j]), j) for j in range(len(switch_ids)) if uncovered_count[j]]
+    heapq.heapify(pq)
+    while pq:
+        current_ratio, j = pq[0]
+        count = uncovered_count[j]
+        if count == 0:
+            heapq.heappop(pq)
+            continue
+        if ratio(count) != current_ratio:
+            heapq.heapreplace(pq, (ratio(count), j))
+            continue
+        heapq.heappop(pq)
+        newly_covered = []
+        for k in range(switch_ptr[j], switch_ptr[j + 1]):
+            i = switch_idx[k]
+            if not covered[i]:
+                covered[i] = 1
+                newly_covered.append(f[i])
+                for kk in range(flow_ptr[i], flow_ptr[i + 1]):
+                    uncovered_count[flow_idx[kk]] -= 1
+        picked_switch[switch_ids[j]] = newly_covered
+
+    if not all(covered):
+        print("Not all flows could be covered with the available switches.")
+    else:
+        print("All flows have been successfully covered.")
+    return picked_switch
+
+
+def capacity_from_bytes(max_bytes: int, weight_fn=weight) -> int:
+    """
+    :return: number of flows a switch can report per polling round without its reply exceeding max_bytes
+    """
+    return max(0, (max_bytes - weight_fn([])) // (weight_fn([0]) - weight_fn([])))
+
+
+def set_cover_solve_capacitated(f: [int], s: dict[int, [int]], capacity: int, weight_fn=weight) -> dict[int, [int]]:
+    """
+    Greedy set cover where every switch polls at most capacity flows per round, so that hub switches do not end up
+    answering most stats requests. A picked switch costs weight_fn of the flows assigned to it; when it has more
+    uncovered flows than capacity, it takes the ones with the fewest other switches left to poll them.
+    Flows whose switches are all full are put on the least loaded switch of their path, exceeding its capacity.
+    :param capacity: maximum number of flows polled on a switch
+    :return: a dict: switch id -> flows to poll, every flow listed exactly once
+    """
+    if capacity < 1:
+        raise ValueError('capacity must be at least 1')
+    switch_ids, switch_ptr, switch_idx, flow_ptr, flow_idx = _build_incidence(f, s)
+    uncovered_count = array('q', (switch_ptr[j + 1] - switch_ptr[j] for j in range(len(switch_ids))))
+    options = array('q', (flow_ptr[i + 1] - flow_ptr[i] for i in range(len(f))))  # unpicked switches per flow
+    covered = bytearray(len(f))
+    picked = bytearray(len(switch_ids))
+    picked_switch = {}
+
+    def ratio(count):
+        count = min(count, capacity)
+        return weight_fn(range(count)) / count
+
+    pq = [(ratio(uncovered_count[j]), j) for j in range(len(switch_ids)) if uncovered_count[j]]
+    heapq.heapify(pq)
+    while pq:
+        current_ratio, j = pq[0]
+        count = uncovered_count[j]
+        if count == 0:
+            heapq.heappop(pq)
+            continue
+        if ratio(count) != current_ratio:
+            heapq.heapreplace(pq, (ratio(count), j))
+            continue
+        heapq.heappop(pq)
+        candidates = [switch_idx[k] for k in range(switch_ptr[j], switch_ptr[j + 1]) if not covered[switch_idx[k]]]
+        if len(candidates) > capacity:
+            # keep the flows that have alternatives for the other switches
+            candidates.sort(key=lambda i: options[i])
+            candidates = candidates[:capacity]
+        picked[j] = 1
+        for k in range(switch_ptr[j], switch_ptr[j + 1]):
+            options[switch_idx[k]] -= 1
+        for i in candidates:
+            covered[i] = 1
+            for k in range(flow_ptr[i], flow_ptr[i + 1]):
+                uncovered_count[flow_idx[k]] -= 1
+        picked_switch[switch_ids[j]] = [f[i] for i in candidates]
+
+    over_capacity = 0
+    for i in range(len(f)):
+        if covered[i] or flow_ptr[i] == flow_ptr[i + 1]:
+            continue
+        j = min((flow_idx[k] for k in range(flow_ptr[i], flow_ptr[i + 1])),
+                key=lambda j: len(picked_switch.get(switch_ids[j], [])))
+        picked_switch.setdefault(switch_ids[j], []).append(f[i])
+        covered[i] = 1
+        over_capacity += 1
+    if over_capacity:
+        print(f"{over_capacity} flows could not be polled within capacity {capacity}.")
+    if not all(covered):
+        print("Not all flows could be covered with the available switches.")
+    else:
+        print("All flows have been successfully covered.")
+    return picked_switch
+
+
+def load_histogram(polling: dict[int, [int]]) -> dict[int, int]:
+    """
+    :return: a dict: number of flows polled on a switch -> number of switches polling that many flows
+    """
+    histogram = {}
+    for flows in polling.values():
+        histogram[len(flows)] = histogram.get(len(flows), 0) + 1
+    return dict(sorted(histogram.items()))
+
+
+def set_cover_lower_bound(f: [int], s: dict[int, [int]]) -> int:
+    """
+    Lower bound on the number of switches any cover needs, from a dual ascent on the LP relaxation:
+    every flow gets as much dual value as all switches on its path still have room for (each switch has room 1).
+    """
+    flow_to_switch_ids = {flow: [] for flow in f}
+    for switch_id, flows in s.items():
+        for flow in flows:
+            if flow in flow_to_switch_ids:
+                flow_to_switch_ids[flow].append(switch_id)
+    slack = {switch_id: 1.0 for switch_id in s}
+    bound = 0.0
+    # flows with few switches are the most constrained, raise them first
+    for flow in sorted(flow_to_switch_ids, key=lambda flow: len(flow_to_switch_ids[flow])):
+        switch_ids = flow_to_switch_ids[flow]
+        if not switch_ids:
+            continue
+        y = min(slack[switch_id] for switch_id in switch_ids)
+        if y <= 0:
+            continue
+        for switch_id in switch_ids:
+            slack[switch_id] -= y
+        bound += y
+    return ceil(bound - 1e-9)
+
+
+def set_cover_solve_anytime(f: [int], s: dict[int, [int]], time_budget: float = 2.0,
+                            initial: dict[int, [int]] = None, seed: int = None,
+                            weight_fn=weight) -> (dict[int, [int]], int, int):
+    """
+    Improves a greedy solution until time_budget seconds have passed.
+    Once every flow is polled exactly once, a plan costs weight_fn([]) per polled switch plus a fixed amount per flow,
+    so the search minimizes the number of polled switches: redundant switches are dropped, and a switch is swapped
+    for an unpolled one that covers everything only it covered whenever that lets a neighbouring switch be dropped.
+    :param f: flow ids to cover
+    :param s: switch id -> flow ids on the switch
+    :param time_budget: wall-clock seconds to spend on improving
+    :param initial: starting solution, the sparse greedy is used if not given
+    :param seed: seed of the local search
+    :param weight_fn: weight model, weight or weight_aggregated
+    :return: (a dict: switch id -> flows to poll, its polling_cost, a lower bound on the polling_cost of any plan)
+    """
+    deadline = timer() + time_budget
+    rng = random.Random(seed)
+    if initial is None:
+        initial = set_cover_solve_sparse(f, s)
+    flow_to_switch_ids = {flow: [] for flow in f}
+    for switch_id, flows in s.items():
+        for flow in flows:
+            if flow in flow_to_switch_ids:
+                flow_to_switch_ids[flow].append(switch_id)
+    switch_flows = {switch_id: [flow for flow in flows if flow in flow_to_switch_ids] for switch_id, flows in s.items()}
+    coverable = [flow for flow, switch_ids in flow_to_switch_ids.items() if switch_ids]
+
+    polled = set(deduplicate_polling(initial).keys())
+    times_covered = {flow: 0 for flow in coverable}
+    for switch_id in polled:
+        for flow in switch_flows[switch_id]:
+            times_covered[flow] += 1
+
+    def is_redundant(switch_id):
+        return all(times_covered[flow] > 1 for flow in switch_flows[switch_id])
+
+    def close(switch_id):
+        polled.remove(switch_id)
+        for flow in switch_flows[switch_id]:
+            times_covered[flow] -= 1
+
+    def open_(switch_id):
+        polled.add(switch_id)
+        for flow in switch_flows[switch_id]:
+            times_covered[flow] += 1
+
+    def cover(flow):
+        # poll an unpolled flow on its switch with the most flows; step 1 drops what this makes redundant
+        switch_id = max(flow_to_switch_ids[flow], key=lambda switch_id: len(switch_flows[switch_id]))
+        open_(switch_id)
+        return switch_id
+
+    # Step 0: an initial solution computed for other flows may miss some of these
+    for flow in coverable:
+        if times_covered[flow] == 0:
+            cover(flow)
+
+    # Step 1: redundant-set elimination, small switches first
+    for switch_id in sorted(polled, key=lambda switch_id: len(switch_flows[switch_id])):
+        if is_redundant(switch_id):
+            close(switch_id)
+
+    bound = set_cover_lower_bound(coverable, switch_flows)
+
+    # Step 2: swap-based local search; moves never increase the cost
+    iterations = 0
+    while len(polled) > bound and timer() < deadline:
+        iterations += 1
+        switch_id = rng.choice(tuple(polled))
+        only_here = [flow for flow in switch_flows[switch_id] if times_covered[flow] == 1]
+        if not only_here:
+            close(switch_id)
+            continue
+        only_here.sort(key=lambda flow: len(flow_to_switch_ids[flow]))
+        candidates = set(flow_to_switch_ids[only_here[0]])
+        for flow in only_here[1:]:
+            candidates.intersection_update(flow_to_switch_ids[flow])
+            if not candidates:
+                break
+        candidates.difference_update(polled)
+        if not candidates:
+            continue
+        replacement = rng.choice(tuple(candidates))
+        close(switch_id)
+        open_(replacement)
+        neighbours = {other for flow in switch_flows[replacement] for other in flow_to_switch_ids[flow]}
+        for other in neighbours & polled:
+            if other != replacement and is_redundant(other):
+                close(other)
+
+    # Step 3: poll every flow on exactly one polled switch
+    polling = {}
+    for flow in coverable:
+        switch_id = next((switch_id for switch_id in flow_to_switch_ids[flow] if switch_id in polled), None)
+        if switch_id is None:
+            switch_id = cover(flow)
+        polling.setdefault(switch_id, []).append(flow)
+    cost = polling_cost(polling, weight_fn)
+    lower_bound = weight_fn([]) * bound + (weight_fn([0]) - weight_fn([])) * len(coverable)
+    print(f'Anytime set cover: {len(polled)} switches after {iterations} local search steps, '
+          f'cost {cost}, lower bound {lower_bound}, gap {(cost - lower_bound) / max(lower_bound, 1):.2%}.')
+    return polling, cost, lower_bound
+
+
+SET_COVER_ENGINES = {
+    'heapq': set_cover_solve,
+    'sparse': set_cover_solve_sparse,
+    'aggregated': set_cover_solve_aggregated,
+}
+
+
+class IncrementalSetCover:
+    """
+    Keeps a set cover solution up to date while flows come and go.
+    A new flow is polled on an already polled switch of its path if there is one, otherwise on the busiest switch of its path;
+    a removed flow is dropped from its switch, which stops being polled once it has nothing left to poll.
+    A full greedy rebuild only happens when the cost per flow drifted more than max_drift above the one of the last rebuild.
+    """
+
+    def __init__(self, flows: dict[int, [int]], max_drift: float = 0.2, engine: str = 'heapq'):
+        """
+        :param flows: initial flows: flow id -> list of switch ids
+        :param max_drift: tolerated relative increase of the cost per flow before rebuilding, e.g. 0.2 for 20%
+        :param engine: set cover engine used for rebuilds, a key of SET_COVER_ENGINES
+        """
+        self.max_drift = max_drift
+        self.engine = engine
+        self.flows = {}  # flow id -> list of switches on flow path
+        self.switch_flows = {}  # switch id -> set of flow ids that pass through it
+        self.polling = {}  # switch id -> set of flow ids polled on it
+        self.polled_at = {}  # flow id -> switch id that polls it
+        self.cost = 0
+        self.rebuild_cost_per_flow = 0.0
+        self.num_rebuilds = 0
+        for flow_id, path in flows.items():
+            self._add_to_index(flow_id, path)
+        self.rebuild()
+
+    def _add_to_index(self, flow_id: int, path: [int]) -> None:
+        if flow_id in self.flows:
+            raise ValueError(f'flow {flow_id} already exists')
+        if not path:
+            raise ValueError(f'flow {flow_id} has an empty path')
+        self.flows[flow_id] = [int(switch_id) for switch_id in path]
+        for switch_id in self.flows[flow_id]:
+            self.switch_flows.setdefault(switch_id, set()).add(flow_id)
+
+    def _poll(self, flow_id: int, switch_id: int) -> None:
+        if switch_id not in self.polling:
+            self.polling[switch_id] = set()
+            self.cost += weight([])
+        self.polling[switch_id].add(flow_id)
+        self.polled_at[flow_id] = switch_id
+        self.cost += weight([0]) - weight([])
+
+    def _unpoll(self, flow_id: int) -> None:
+        switch_id = self.polled_at.pop(flow_id)
+        self.polling[switch_id].discard(flow_id)
+        self.cost -= weight([0]) - weight([])
+        if not self.polling[switch_id]:
+            del self.polling[switch_id]
+            self.cost -= weight([])
+
+    def drift(self) -> float:
+        """
+        Relative increase of the current cost per flow over the cost per flow right after the last rebuild.
+        """
+        if not self.flows:
+            return 0.0
+        if not self.rebuild_cost_per_flow:
+            return float('inf')
+        return self.cost / len(self.flows) / self.rebuild_cost_per_flow - 1
+
+    def rebuild(self) -> None:
+        """
+        Recomputes the whole cover from scratch with the configured engine.
+        """
+        self.polling = {}
+        self.polled_at = {}
+        self.cost = 0
+        if self.flows:
+            switch_flows = {switch_id: list(flows) for switch_id, flows in self.switch_flows.items()}
+            solution = SET_COVER_ENGINES[self.engine](list(self.flows.keys()), switch_flows)
+            for switch_id, flows in deduplicate_polling(solution).items():
+                for flow_id in flows:
+                    self._poll(flow_id, switch_id)
+            self.rebuild_cost_per_flow = self.cost / len(self.flows)
+        self.num_rebuilds += 1
+
+    def _rebuild_if_drifted(self) -> None:
+        if self.drift() > self.max_drift:
+            print(f'Set cover drifted by {self.drift():.1%}, rebuilding.')
+            self.rebuild()
+
+    def add_flow(self, flow_id: int, path: [int]) -> None:
+        """
+        Adds a flow and polls it on an already polled switch of its path if possible.
+        """
+        self._add_to_index(flow_id, path)
+        path = self.flows[flow_id]
+        switch_id = next((s for s in path if s in self.polling), None)
+        if switch_id is None:
+            switch_id = max(path, key=lambda s: len(self.switch_flows[s]))
+        self._poll(flow_id, switch_id)
+        self._rebuild_if_drifted()
+
+    def remove_flow(self, flow_id: int) -> None:
+        """
+        Removes a flow; raises KeyError if it does not exist.
+        """
+        path = self.flows.pop(flow_id)
+        for switch_id in path:
+            self.switch_flows[switch_id].discard(flow_id)
+            if not self.switch_flows[switch_id]:
+                del self.switch_flows[switch_id]
+        self._unpoll(flow_id)
+        self._rebuild_if_drifted()
+
+    def current_polling(self) -> dict[int, [int]]:
+        """
+        :return: a dict: switch id -> flows to poll, every flow listed exactly once
+        """
+        return {switch_id: list(flows) for switch_id, flows in self.polling.items()}
+
+
 if "__main__" == __name__:
     f =[1,2,3,4,5,6,7,8,9]
     s = {
@@ -106,4 +831,5 @@ if "__main__" == __name__:
         6:[3,4,6],
         7:[2,4,7,8,9]
     }
-    print(set_cover_solve(f,s))
\ No newline at end of file
+    print(set_cover_solve(f,s))
+    print(set_cover_solve_sparse(f,s))
\ No newline at end of file
@@ -0,0 +1,109 @@
+import argparse
+import os
+import random
+from contextlib import redirect_stdout
+from timeit import default_timer as timer
+
+from utils.FlowGenerator import generate_random_flows, generate_switch_flow_list
+from utils.GraphGenerator import erdos_renyi_generator, waxman_generator_1
+from utils.SetCover import SET_COVER_ENGINES, set_cover_solve_partitioned
+
+# engines minimizing another cost than heapq, with the note printed on their rows
+OTHER_COST_MODELS = {
+    'aggregated': 'cookie-masked cost model (weight_aggregated), not comparable to heapq',
+}
+
+
+def random_instance(num_flows: int, num_switches: int, max_path_length: int, seed: int) -> dict[int, [int]]:
+    """
+    Generates a synthetic flow set: every flow visits 2..max_path_length distinct random switches.
+    Cheap enough to build 1M flows, which the topology based generator is not meant for.
+    :return: a dict: flow id -> list of switch ids
+    """
+    rng = random.Random(seed)
+    switches = range(1, num_switches + 1)
+    return {flow_id: rng.sample(switches, rng.randint(2, max_path_length)) for flow_id in range(1, num_flows + 1)}
+
+
+def topology_instance(num_flows: int, topology: str, num_switches: int, max_path_length: int,
+                      seed: int) -> dict[int, [int]]:
+    """
+    Generates random flows on the topologies of the emulations, see network.SimulatedNetwork.
+    :return: a dict: flow id -> list of switch ids
+    """
+    if topology == 'erdos-renyi':
+        graph = erdos_renyi_generator(num_switches, 0.1, seed)
+    else:
+        graph = waxman_generator_1(num_switches, 0.5, 0.5, seed)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        return generate_random_flows(num_flows, graph, seed, max_path_length)
+
+
+def run_engine(engine: str, flows: dict[int, [int]], switch_flows: dict[int, [int]]) -> (float, dict[int, [int]]):
+    # the engines print their progress; keep it out of the measurement output
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = timer()
+        if engine == 'partitioned':
+            polling = set_cover_solve_partitioned(list(flows.keys()), switch_flows, 'sparse')
+        else:
+            polling = SET_COVER_ENGINES[engine](list(flows.keys()), switch_flows)
+        elapsed = timer() - start
+    covered = set()
+    for polled_flows in polling.values():
+        covered.update(polled_flows)
+    assert covered.issuperset(flows.keys()), f'{engine} left flows uncovered'
+    return elapsed, polling
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark set cover engines')
+    parser.add_argument('--sizes', default=[1000, 10000, 100000, 1000000], type=int, nargs='+')
+    parser.add_argument('--num-switches', default=200, type=int)
+    parser.add_argument('--max-path-length', default=8, type=int)
+    parser.add_argument('--engines', default=list(SET_COVER_ENGINES.keys()), nargs='+',
+                        help='keys of SET_COVER_ENGINES, or partitioned for the sparse engine on partitioned parts')
+    parser.add_argument('--topology', default='random', choices=['random', 'erdos-renyi', 'waxman'],
+                        help='random draws paths over any switches; erdos-renyi and waxman route them on the graphs '
+                             'of the emulations')
+    parser.add_argument('--max-heapq-flows', default=100000, type=int,
+                        help='run the heapq engine up to this many flows; above, its time is extrapolated from the '
+                             'largest run, it grows quadratically (50k flows: 25s, 100k flows: 96s)')
+    parser.add_argument('--seed', default=0, type=int)
+    args = parser.parse_args()
+
+    print(f'{"flows":>10} {"engine":>11} {"seconds":>10} {"switches":>9} {"speedup":>8}')
+    largest_heapq = None  # (flows, seconds) of the largest heapq run
+    for num_flows in sorted(args.sizes):
+        if args.topology == 'random':
+            flows = random_instance(num_flows, args.num_switches, args.max_path_length, args.seed)
+        else:
+            flows = topology_instance(num_flows, args.topology, args.num_switches, args.max_path_length, args.seed)
+        switch_flows = generate_switch_flow_list(flows)
+        baseline = None
+        estimated = False
+        for engine in args.engines:
+            if engine == 'heapq' and num_flows > args.max_heapq_flows:
+                if largest_heapq is None:
+                    print(f'{num_flows:>10} {engine:>11} {"skipped":>10}')
+                    continue
+                baseline = largest_heapq[1] * (num_flows / largest_heapq[0]) ** 2
+                estimated = True
+                print(f'{num_flows:>10} {engine:>11} {f"~{baseline:.3f}":>10} {"-":>9} {"-":>8}  '
+                      f'extrapolated from {largest_heapq[0]} flows')
+                continue
+            elapsed, polling = run_engine(engine, flows, switch_flows)
+            if engine == 'heapq':
+                baseline = elapsed
+                largest_heapq = (num_flows, elapsed)
+            if engine in OTHER_COST_MODELS:
+                # solves a different problem, so its time is not a speedup over heapq
+                print(f'{num_flows:>10} {engine:>11} {elapsed:>10.3f} {len(polling):>9} {"n/a":>8}  '
+                      f'{OTHER_COST_MODELS[engine]}')
+                continue
+            speedup = '-'
+            if baseline is not None:
+                speedup = f'{"~" if estimated else ""}{baseline / elapsed:.1f}x'
+            print(f'{num_flows:>10} {engine:>11} {elapsed:>10.3f} {len(polling):>9} {speedup:>8}')
+
+if __name__ == '__main__':
+    main()
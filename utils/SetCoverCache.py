@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import zlib
+from array import array
+
+from utils.SetCover import SET_COVER_VERSION
+
+
+class SetCoverCache:
+    """
+    On-disk cache of set cover solutions, keyed by a hash of the whole problem
+    (flows, switch_flows, weight model, solver settings and SET_COVER_VERSION).
+    Every solution is one zlib-compressed array of int64: switch id, number of flows, flow ids, switch id, ...
+    When the cache grows above max_bytes, the least recently used solutions are evicted.
+    Hit/miss counters are kept in stats.json next to the solutions so they add up across runs.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.stats_filename = os.path.join(directory, 'stats.json')
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(self.stats_filename):
+            with open(self.stats_filename, 'r') as f:
+                stats = json.load(f)
+                self.hits = stats['hits']
+                self.misses = stats['misses']
+
+    @staticmethod
+    def key(flows: dict[int, [int]], switch_flows: dict[int, [int]], weight_model: str, solver: str) -> str:
+        """
+        Stable hash of a set cover problem; the order of switch_flows is part of the key as it breaks greedy ties.
+        """
+        h = hashlib.sha256()
+        h.update(f'{SET_COVER_VERSION}|{weight_model}|{solver}|'.encode())
+        for mapping in (flows, switch_flows):
+            buf = array('q')
+            for k, values in mapping.items():
+                buf.append(int(k))
+                buf.append(len(values))
+                buf.extend(int(v) for v in values)
+            buf.append(-1)
+            h.update(buf.tobytes())
+        return h.hexdigest()
+
+    def _filename(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.bin')
+
+    def _save_stats(self) -> None:
+        with open(self.stats_filename, 'w') as f:
+            json.dump({'hits': self.hits, 'misses': self.misses}, f)
+
+    def get(self, key: str) -> dict[int, [int]]:
+        """
+        :return: the cached solution, None on a miss
+        """
+        filename = self._filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                buf = array('q', zlib.decompress(f.read()))
+        except (OSError, zlib.error):
+            self.misses += 1
+            self._save_stats()
+            return None
+        os.utime(filename)  # mark as recently used
+        polling = {}
+        i = 0
+        while i < len(buf):
+            switch_id, num_flows = buf[i], buf[i + 1]
+            polling[switch_id] = buf[i + 2:i + 2 + num_flows].tolist()
+            i += 2 + num_flows
+        self.hits += 1
+        self._save_stats()
+        return polling
+
+    def put(self, key: str, polling: dict[int, [int]]) -> None:
+        buf = array('q')
+        for switch_id, flows in polling.items():
+            buf.append(int(switch_id))
+            buf.append(len(flows))
+            buf.extend(int(flow) for flow in flows)
+        filename = self._filename(key)
+        with open(filename + '.tmp', 'wb') as f:
+            f.write(zlib.compress(buf.tobytes()))
+        os.replace(filename + '.tmp', filename)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Deletes least recently used solutions until the cache fits in max_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.bin'):
+                st = os.stat(os.path.join(self.directory, name))
+                entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
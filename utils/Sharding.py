@@ -0,0 +1,108 @@
+import json
+import os
+from typing import Iterable, Optional
+
+# Sharded mode: switches are split over several controller processes, shard k listens on BASE_CONTROLLER_PORT + k.
+# Shard 0 is the coordinator: it plans flows and set cover for everyone and writes one plan per shard.
+# All coordination goes through files in the shard directory:
+#   flows_planned    random_flows.bin is complete, the shards can build their forwarding rules
+#   plan_<k>.json    switch id -> flows to poll, for the switches of shard k
+#   ready_<k>        shard k confirmed the rules of all its switches
+#   stats_<k>.json   final flow stats of shard k
+BASE_CONTROLLER_PORT = 6653
+
+
+def shard_of(switch_id: int, num_shards: int) -> int:
+    """
+    :return: the shard owning a switch; switch ids start at 1
+    """
+    return (switch_id - 1) % num_shards
+
+
+def shard_port(shard_id: int, base_port: int = BASE_CONTROLLER_PORT) -> int:
+    """
+    :return: the OpenFlow listen port of a shard
+    """
+    return base_port + shard_id
+
+
+def partition_polling(polling: dict[int, [int]], num_shards: int) -> [dict[int, [int]]]:
+    """
+    :return: the polling plan of every shard, only holding the switches it owns
+    """
+    parts = [{} for _ in range(num_shards)]
+    for switch_id, flows in polling.items():
+        parts[shard_of(switch_id, num_shards)][switch_id] = flows
+    return parts
+
+
+def _write_atomic(filename: str, data: str) -> None:
+    # readers poll for the file, so it has to appear complete
+    with open(filename + '.tmp', 'w') as f:
+        f.write(data)
+    os.replace(filename + '.tmp', filename)
+
+
+def reset_shard_dir(directory: str) -> None:
+    """
+    Removes the files of an earlier run; called by the coordinator before it plans.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.startswith(('flows_planned', 'plan_', 'ready_', 'stats_')):
+            os.remove(os.path.join(directory, name))
+
+
+def mark_flows_planned(directory: str) -> None:
+    _write_atomic(os.path.join(directory, 'flows_planned'), '')
+
+
+def flows_planned(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, 'flows_planned'))
+
+
+def write_shard_plan(directory: str, shard_id: int, polling: dict[int, [int]]) -> None:
+    _write_atomic(os.path.join(directory, f'plan_{shard_id}.json'),
+                  json.dumps({str(switch_id): list(flows) for switch_id, flows in polling.items()}))
+
+
+def read_shard_plan(directory: str, shard_id: int) -> Optional[dict[int, list[int]]]:
+    """
+    :return: the polling plan of a shard, None if the coordinator has not written it yet
+    """
+    filename = os.path.join(directory, f'plan_{shard_id}.json')
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'r') as f:
+        return {int(switch_id): flows for switch_id, flows in json.load(f).items()}
+
+
+def mark_shard_ready(directory: str, shard_id: int) -> None:
+    _write_atomic(os.path.join(directory, f'ready_{shard_id}'), '')
+
+
+def all_shards_ready(directory: str, num_shards: int) -> bool:
+    return all(os.path.exists(os.path.join(directory, f'ready_{k}')) for k in range(num_shards))
+
+
+def write_shard_stats(directory: str, shard_id: int, flow_stats: dict[int, int]) -> None:
+    _write_atomic(os.path.join(directory, f'stats_{shard_id}.json'), json.dumps(flow_stats))
+
+
+def merge_shard_stats(directory: str, shard_ids: Iterable[int]) -> (dict[int, int], [int]):
+    """
+    A flow polled by several shards keeps its largest byte count.
+    :return: the merged flow stats of the shards that wrote theirs, and the ids of the shards that did not
+    """
+    merged = {}
+    missing = []
+    for shard_id in shard_ids:
+        filename = os.path.join(directory, f'stats_{shard_id}.json')
+        if not os.path.exists(filename):
+            missing.append(shard_id)
+            continue
+        with open(filename, 'r') as f:
+            for flow_id, byte_count in json.load(f).items():
+                flow_id = int(flow_id)
+                merged[flow_id] = max(byte_count, merged.get(flow_id, 0))
+    return merged, missing
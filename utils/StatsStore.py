@@ -0,0 +1,163 @@
+import json
+import os
+import queue
+import struct
+import threading
+from typing import Iterator, Optional
+
+import numpy as np
+
+# Append-only log of flow stats, one record per polling round holding only the flows whose counter changed:
+#   segment header   magic, version
+#   round record     timestamp (float64 seconds since the epoch), number of entries n
+#                    n * (flow id uint32, byte count uint64)
+# Segments are named stats_00000.bin, stats_00001.bin, ... and a new one is started once a segment exceeds its size.
+# Every run writes its segments into a run directory of its own, run_00000, run_00001, ...
+STATS_STORE_MAGIC = b'FCST'
+STATS_STORE_VERSION = 1
+_HEADER = struct.Struct('<4sI')
+_ROUND = struct.Struct('<dI')
+ENTRY_DTYPE = np.dtype([('flow_id', '<u4'), ('byte_count', '<u8')])
+
+
+def _segment_name(directory: str, number: int) -> str:
+    return os.path.join(directory, f'stats_{number:05d}.bin')
+
+
+def _segments(directory: str) -> [str]:
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.startswith('stats_') and name.endswith('.bin'))
+
+
+def _run_number(name: str) -> Optional[int]:
+    if name.startswith('run_') and name[4:].isdigit():
+        return int(name[4:])
+    return None
+
+
+def latest_run(directory: str) -> Optional[str]:
+    """
+    :return: the run directory written last by a StatsStore on directory, None if there is none
+    """
+    if not os.path.isdir(directory):
+        return None
+    numbers = [number for number in map(_run_number, os.listdir(directory)) if number is not None]
+    return os.path.join(directory, f'run_{max(numbers):05d}') if numbers else None
+
+
+class StatsStore:
+    """
+    Writes per-round stats deltas to segmented binary files from a background thread,
+    so the polling loop only pays for handing the changed flows over.
+    """
+
+    def __init__(self, directory: str, max_segment_bytes: int = 64 * 2**20):
+        """
+        :param directory: holds one run directory per run; the segments go into a new one, earlier runs are kept
+        :param max_segment_bytes: size after which the next round starts a new segment
+        """
+        os.makedirs(directory, exist_ok=True)
+        latest = latest_run(directory)
+        number = _run_number(os.path.basename(latest)) + 1 if latest is not None else 0
+        while True:
+            # another process may take the same number, mkdir fails for one of them
+            try:
+                os.mkdir(os.path.join(directory, f'run_{number:05d}'))
+                break
+            except FileExistsError:
+                number += 1
+        self.directory = os.path.join(directory, f'run_{number:05d}')
+        self.max_segment_bytes = max_segment_bytes
+        self.segment = 0
+        self.file = self._open_segment()
+        self.rounds = 0
+        self.bytes_written = 0
+        self.queue: queue.Queue[Optional[tuple[float, np.ndarray]]] = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, name='stats-store-writer', daemon=True)
+        self.writer.start()
+
+    def _open_segment(self):
+        f = open(_segment_name(self.directory, self.segment), 'wb')
+        f.write(_HEADER.pack(STATS_STORE_MAGIC, STATS_STORE_VERSION))
+        return f
+
+    def append(self, timestamp: float, deltas: dict[int, int]) -> None:
+        """
+        Queues one round; returns immediately.
+        :param timestamp: time of the round, seconds since the epoch
+        :param deltas: flow id -> byte count of the flows that changed in this round
+        """
+        entries = np.fromiter(deltas.items(), dtype=ENTRY_DTYPE, count=len(deltas))
+        self.queue.put((timestamp, entries))
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.file.close()
+                return
+            timestamp, entries = item
+            if self.file.tell() > self.max_segment_bytes:
+                self.file.close()
+                self.segment += 1
+                self.file = self._open_segment()
+            record = _ROUND.pack(timestamp, len(entries)) + entries.tobytes()
+            self.file.write(record)
+            self.file.flush()
+            self.rounds += 1
+            self.bytes_written += len(record)
+
+    def close(self) -> None:
+        """
+        Writes all queued rounds and closes the current segment.
+        """
+        self.queue.put(None)
+        self.writer.join()
+
+
+def iter_rounds(directory: str) -> Iterator[tuple[float, np.ndarray]]:
+    """
+    Reads the rounds of all segments of a run in order.
+    :param directory: a run directory, see latest_run
+    :return: generator of (timestamp, entries) with entries a structured array of flow_id and byte_count
+    """
+    for filename in _segments(directory):
+        with open(filename, 'rb') as f:
+            magic, version = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != STATS_STORE_MAGIC or version != STATS_STORE_VERSION:
+                raise ValueError(f'{filename} is not a version {STATS_STORE_VERSION} stats segment')
+            while True:
+                header = f.read(_ROUND.size)
+                if len(header) < _ROUND.size:
+                    break
+                timestamp, n = _ROUND.unpack(header)
+                data = f.read(n * ENTRY_DTYPE.itemsize)
+                if len(data) < n * ENTRY_DTYPE.itemsize:
+                    # round cut off by a crash while writing
+                    break
+                yield timestamp, np.frombuffer(data, dtype=ENTRY_DTYPE)
+
+
+def read_snapshot(directory: str, until: Optional[float] = None) -> dict[int, int]:
+    """
+    Replays the log.
+    :param until: only apply rounds up to this timestamp, all rounds if None
+    :return: a dict: flow id -> byte count
+    """
+    snapshot = {}
+    for timestamp, entries in iter_rounds(directory):
+        if until is not None and timestamp > until:
+            break
+        snapshot.update(zip(entries['flow_id'].tolist(), entries['byte_count'].tolist()))
+    return snapshot
+
+
+def export_json(filename: str, flow_stats: dict[int, int]) -> None:
+    """
+    Writes a snapshot in the stats/flow_stats.json format read by figures.ipynb.
+    """
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    with open(filename, 'w') as f:
+        json.dump(flow_stats, f, indent=4)
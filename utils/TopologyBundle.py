@@ -0,0 +1,174 @@
+import struct
+from collections.abc import Mapping
+from typing import Iterator
+
+import networkx as nx
+import numpy as np
+
+# Topology bundle written by Mininet and read by the controller, replacing topology.bin, random_type.txt and
+# the two pickled port dicts. Little-endian, every array starts on an 8-byte boundary:
+#   header      magic, version, random type code, number of switches n, number of adjacency entries a (= 2 * edges)
+#   node_ids    int32[n]     switch ids, ascending
+#   indptr      int64[n + 1] CSR row pointer into adjacency/ports
+#   adjacency   int32[a]     neighbour switch ids, ascending per row
+#   ports       int32[a]     port of the row switch towards adjacency[i]
+#   host_ports  int32[n]     port of the switch towards its own host, -1 if none
+TOPOLOGY_BUNDLE_MAGIC = b'FCTB'
+TOPOLOGY_BUNDLE_VERSION = 1
+RANDOM_TYPES = ['linear', 'erdos-renyi', 'waxman']
+_HEADER = struct.Struct('<4sHHIQ8x')
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) // 8 * 8
+
+
+def _layout(n: int, a: int) -> dict[str, (int, np.dtype, int)]:
+    """
+    :return: array name -> (byte offset, dtype, length)
+    """
+    layout = {}
+    offset = _HEADER.size
+    for name, dtype, length in (('node_ids', np.int32, n), ('indptr', np.int64, n + 1), ('adjacency', np.int32, a),
+                                ('ports', np.int32, a), ('host_ports', np.int32, n)):
+        offset = _align(offset)
+        layout[name] = (offset, np.dtype(dtype).newbyteorder('<'), length)
+        offset += np.dtype(dtype).itemsize * length
+    return layout
+
+
+def write_topology_bundle(filename: str, graph: nx.Graph, random_type: str,
+                          switch_switch_port: dict[(int, int), int], switch_host_port: dict[(int, int), int]) -> None:
+    """
+    Writes the topology and its port tables as one bundle file.
+    """
+    node_ids = np.array(sorted(int(s) for s in graph.nodes), dtype=np.int32)
+    indptr = [0]
+    neighbors = []
+    ports = []
+    for s in node_ids.tolist():
+        row = sorted(int(t) for t in graph.neighbors(s) if int(t) != s)
+        neighbors.extend(row)
+        ports.extend(switch_switch_port[(s, t)] for t in row)
+        indptr.append(len(neighbors))
+    host_ports = [switch_host_port.get((s, s), -1) for s in node_ids.tolist()]
+    layout = _layout(len(node_ids), len(neighbors))
+    arrays = {
+        'node_ids': node_ids,
+        'indptr': np.array(indptr, dtype=np.int64),
+        'adjacency': np.array(neighbors, dtype=np.int32),
+        'ports': np.array(ports, dtype=np.int32),
+        'host_ports': np.array(host_ports, dtype=np.int32),
+    }
+    with open(filename, 'wb') as f:
+        f.write(_HEADER.pack(TOPOLOGY_BUNDLE_MAGIC, TOPOLOGY_BUNDLE_VERSION, RANDOM_TYPES.index(random_type),
+                             len(node_ids), len(neighbors)))
+        for name, (offset, dtype, _) in layout.items():
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(arrays[name].astype(dtype).tobytes())
+
+
+class TopologyBundle:
+    """
+    Memory-mapped view of a topology bundle; nothing is parsed or unpickled, arrays are read straight from the map.
+    switch_switch_port and switch_host_port are read-only mappings with the same int keys as the dicts they replace.
+    """
+
+    def __init__(self, filename: str):
+        self.memmap = np.memmap(filename, dtype=np.uint8, mode='r')
+        magic, version, random_type, n, a = _HEADER.unpack(self.memmap[:_HEADER.size].tobytes())
+        if magic != TOPOLOGY_BUNDLE_MAGIC or version != TOPOLOGY_BUNDLE_VERSION:
+            raise ValueError(f'{filename} is not a version {TOPOLOGY_BUNDLE_VERSION} topology bundle')
+        self.random_type = RANDOM_TYPES[random_type]
+        for name, (offset, dtype, length) in _layout(n, a).items():
+            setattr(self, name, np.frombuffer(self.memmap, dtype=dtype, count=length, offset=offset))
+        self._dense = n == 0 or int(self.node_ids[-1]) - int(self.node_ids[0]) + 1 == n
+        self.switch_switch_port = SwitchSwitchPortView(self)
+        self.switch_host_port = SwitchHostPortView(self)
+
+    def row(self, switch_id: int) -> int:
+        """
+        :return: position of a switch in node_ids; raises KeyError if it does not exist
+        """
+        if self._dense:
+            row = switch_id - int(self.node_ids[0]) if len(self.node_ids) else -1
+        else:
+            row = int(np.searchsorted(self.node_ids, switch_id))
+        if 0 <= row < len(self.node_ids) and self.node_ids[row] == switch_id:
+            return row
+        raise KeyError(switch_id)
+
+    def neighbors(self, switch_id: int) -> np.ndarray:
+        row = self.row(switch_id)
+        return self.adjacency[self.indptr[row]:self.indptr[row + 1]]
+
+    def switch_port(self, from_switch: int, to_switch: int) -> int:
+        """
+        :return: port of from_switch towards to_switch; raises KeyError if they are not connected
+        """
+        row = self.row(from_switch)
+        start, end = int(self.indptr[row]), int(self.indptr[row + 1])
+        i = start + int(np.searchsorted(self.adjacency[start:end], to_switch))
+        if i < end and self.adjacency[i] == to_switch:
+            return int(self.ports[i])
+        raise KeyError((from_switch, to_switch))
+
+    def host_port(self, switch_id: int) -> int:
+        """
+        :return: port of a switch towards its own host; raises KeyError if it has none
+        """
+        port = int(self.host_ports[self.row(switch_id)])
+        if port < 0:
+            raise KeyError((switch_id, switch_id))
+        return port
+
+    def to_networkx(self) -> nx.Graph:
+        """
+        :return: the topology as a networkx graph with int nodes
+        """
+        g = nx.Graph()
+        g.add_nodes_from(self.node_ids.tolist())
+        rows = np.repeat(self.node_ids, np.diff(self.indptr))
+        upper = rows < self.adjacency
+        g.add_edges_from(zip(rows[upper].tolist(), self.adjacency[upper].tolist()))
+        return g
+
+
+class SwitchSwitchPortView(Mapping):
+    """
+    (switch id from, to) -> port id, backed by a TopologyBundle.
+    """
+
+    def __init__(self, bundle: TopologyBundle):
+        self.bundle = bundle
+
+    def __getitem__(self, key: (int, int)) -> int:
+        return self.bundle.switch_port(*key)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        rows = np.repeat(self.bundle.node_ids, np.diff(self.bundle.indptr))
+        return zip(rows.tolist(), self.bundle.adjacency.tolist())
+
+    def __len__(self) -> int:
+        return len(self.bundle.adjacency)
+
+
+class SwitchHostPortView(Mapping):
+    """
+    (switch id, host id) -> port id, backed by a TopologyBundle. Every host hangs off the switch with its id.
+    """
+
+    def __init__(self, bundle: TopologyBundle):
+        self.bundle = bundle
+
+    def __getitem__(self, key: (int, int)) -> int:
+        switch_id, host_id = key
+        if switch_id != host_id:
+            raise KeyError(key)
+        return self.bundle.host_port(switch_id)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return ((s, s) for s, port in zip(self.bundle.node_ids.tolist(), self.bundle.host_ports.tolist()) if port >= 0)
+
+    def __len__(self) -> int:
+        return int((self.bundle.host_ports >= 0).sum())